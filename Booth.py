@@ -7,13 +7,12 @@
 # - Improved serial (Bluetooth) handling and clear error messages
 # - Admin flow: set password then open settings immediately
 # - Safe music download to 'selected_song.mp3' (overwrites intentionally)
-# - Basic session logging to sessions.csv
+# - Session logging to the session ledger (ledger.py)
 
 import tkinter as tk
 from tkinter import messagebox, simpledialog, scrolledtext
 import os
 import json
-import hashlib
 import threading
 import subprocess
 import time
@@ -26,7 +25,6 @@ from requests.auth import HTTPBasicAuth
 import serial
 import yt_dlp
 import pygame
-import csv
 import shutil
 from PIL import Image, ImageTk
 import pickle
@@ -35,10 +33,13 @@ from googleapiclient.http import MediaFileUpload
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 import qrcode
+from camera import get_camera
+from face_detectors import detector_from_settings
+from config import VIDEO_DIR
+import catalog
+import ledger
 
 PI_SAVE_DIR = "/home/pi/booth_videos"
-SETTINGS_FILE = 'settings.json'
-SESSIONS_CSV = 'sessions.csv'
 MUSIC_FILE = "selected_song.mp3"
 PREVIEW_FILE = "preview_temp.mp3"
 SELECTED_FILE = "selected_song.mp3"
@@ -48,21 +49,10 @@ TOKEN_FILE = "token.pickle"
 
 
 # === SETTINGS LOAD/SAVE ===
-def load_settings():
-    if os.path.exists(SETTINGS_FILE):
-        with open(SETTINGS_FILE, 'r') as f:
-            return json.load(f)
-    return {"password": None, "price": 50.0, "till_number": "",
-            "record_time": 20, "email": "", "camera_type": "webcam"}
+# Same store as main.py (settings.py): atomic, debounced saves
+from settings import settings, load_settings, save_settings, settings_damaged, clear_damaged, hash_password
 
-def save_settings():
-    with open(SETTINGS_FILE, 'w') as f:
-        json.dump(settings, f, indent=4)
-
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-settings = load_settings()
+load_settings()
 
 # === LOGGER ===
 root = tk.Tk()
@@ -74,9 +64,6 @@ log_text.pack(pady=10)
 countdown_label = tk.Label(root, text="Waiting...", font=("Arial", 14))
 countdown_label.pack(pady=5)
 
-if not os.path.exists(SESSIONS_CSV):
-    with open(SESSIONS_CSV, 'w', newline='') as f:
-        csv.writer(f).writerow(['timestamp', 'phone', 'song_title', 'duration', 'status', 'amount'])
 
 def log(msg):
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -232,13 +219,14 @@ def initiate_mpesa_payment(phone_number, amount):
             for _ in range(30):
                 time.sleep(1)
                 if query_mpesa_status(checkout_id):
-                    return True
+                    return checkout_id
         return False
     except Exception as e:
         log(f"MPesa initiation error: {e}")
         return False
 
 # === SESSION / RECORDING ===
+last_payment_phone = last_checkout_id = last_paid_at = None   # set when a payment is confirmed
 pygame.mixer.init()
 def play_selected_song():
     if os.path.exists(SELECTED_FILE):
@@ -266,24 +254,22 @@ def fullscreen_countdown(seconds, on_complete):
         cs.after(1000, lambda: tick(t-1))
     tick(seconds)
 
-# Load Haar cascade from local file
-face_cascade = cv2.CascadeClassifier('haarcascade_frontalface_default.xml')
-if face_cascade.empty():
-    raise Exception("Failed to load face cascade! Ensure haarcascade_frontalface_default.xml exists.")
+# Face detector backend from settings (haar / lbp / yunet)
+face_detector = detector_from_settings(settings)
     
 def start_session(direction):
     log("Starting session...")
     duration = int(settings.get('record_time', 10))
     def after_countdown():
-        cap = cv2.VideoCapture(0)
-        if not cap.isOpened(): log("❌ Webcam not detected"); return
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap = get_camera().subscribe(maxsize=4)  # shared, already-warm camera
+        if cap is None: log("❌ Webcam not detected"); return
+        width, height = get_camera().size
         fps = 30
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        os.makedirs("videos", exist_ok=True)
-        video_path = f"videos/Finetake_Photography_{ts}.mp4"
+        os.makedirs(VIDEO_DIR, exist_ok=True)
+        video_path = os.path.join(VIDEO_DIR, f"Finetake_Photography_{ts}.mp4")
         out = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+        catalog.add(video_path, last_payment_phone, codec='mp4v')
         send_motor_command(direction)
         play_selected_song()
         
@@ -298,7 +284,7 @@ def start_session(direction):
                 
                 # --- FACE DETECTION ---
                 gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+                faces = face_detector.detect(gray)
                 
                 if len(faces) > 0:
                     # pick largest face
@@ -323,13 +309,12 @@ def start_session(direction):
                 remaining = duration - int(time.time() - start_time)
                 update_countdown_text(f"Recording... {remaining}s")
             cap.release(); out.release(); cv2.destroyAllWindows()
+            catalog.finish(video_path, round(time.time() - start_time, 2))
             send_motor_command('S'); pygame.mixer.music.stop()
             update_countdown_text("Done")
-            try:
-                with open(SESSIONS_CSV, 'a', newline='') as f:
-                    csv.writer(f).writerow([datetime.now().isoformat(), last_payment_phone,
-                                             settings.get('last_song_title', ''), duration, 'OK', settings.get('price')])
-            except Exception as e: log(f"CSV write error: {e}")
+            ledger.record(last_payment_phone, round(time.time() - start_time, 2), settings.get('price'),
+                          settings.get('last_song_title') or None, last_checkout_id, video_path,
+                          paid_at=last_paid_at, started_at=start_time)
             log(f"✅ Session completed → {video_path}")
         threading.Thread(target=record_loop, daemon=True).start()
     fullscreen_countdown(3, after_countdown)
@@ -353,7 +338,8 @@ def start_flow():
             try:
                 success = initiate_mpesa_payment(phone, amount)
                 if success:
-                    global last_payment_phone; last_payment_phone = phone
+                    global last_payment_phone, last_checkout_id, last_paid_at
+                    last_payment_phone, last_checkout_id, last_paid_at = phone, success, time.time()
                     update_countdown_text('Payment confirmed. Starting soon...')
                     threading.Thread(target=lambda: start_session('F'), daemon=True).start()
                 else:
@@ -365,10 +351,15 @@ def start_flow():
 # === ADMIN SETTINGS ===
 def admin_login():
     if settings.get("password") is None:
+        if settings_damaged():
+            if not messagebox.askyesno("Settings Damaged", "settings.json could not be read (kept as settings.json.corrupt).\n"
+                                       "Continue with default settings and set a new password?"):
+                return
+            clear_damaged()
         pw = simpledialog.askstring("Set Password", "Create a password:", show='*')
         if not pw: return
         settings["password"] = hash_password(pw)
-        save_settings()
+        save_settings(now=True)
         messagebox.showinfo("Password Set", "Password saved. Opening settings now.")
         open_settings()
         return
@@ -0,0 +1,64 @@
+# analysis.py
+# Per-frame analysis shared by the webcam stages (centering, brightness,
+# focus). Luma is computed once per frame; the statistics are built lazily
+# on decimated copies, so each stage only pays for what it reads.
+from functools import cached_property
+
+import cv2
+import numpy as np
+
+STATS_STEP = 4       # brightness and histogram use every 4th pixel/row
+
+
+def _decimate(img, step, pool=None, name=None):
+    """Keep every `step`-th pixel and row (contiguous, unlike a strided view)."""
+    h, w = img.shape[:2]
+    size = (w // step, h // step)
+    dst = pool.get(name, (size[1], size[0])) if pool else None
+    return cv2.resize(img, size, dst=dst, interpolation=cv2.INTER_NEAREST)
+
+
+class FrameAnalysis:
+    """
+    Lazily computed luma and statistics for one BGR frame. With a
+    FramePool the luma and decimated images reuse pooled buffers.
+    """
+
+    def __init__(self, frame, pool=None):
+        self.frame = frame
+        self.pool = pool
+
+    @cached_property
+    def gray(self):
+        """Full-resolution luma (computed once)."""
+        dst = self.pool.get("gray", self.frame.shape[:2]) if self.pool else None
+        return cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY, dst=dst)
+
+    @cached_property
+    def small(self):
+        """Decimated luma used for the global statistics."""
+        return _decimate(self.gray, STATS_STEP, self.pool, "gray_stats")
+
+    @cached_property
+    def brightness(self):
+        """Mean luma, 0-255."""
+        return float(self.small.mean())
+
+    @cached_property
+    def sharpness(self):
+        """
+        Laplacian variance of the full-resolution luma, the same measure
+        _auto_focus's threshold was tuned on. (Decimating first aliases the
+        high frequencies and changes the scale.) CV_32F is exact for 8-bit
+        input, so only the saving of the shared luma is taken here.
+        meanStdDev reads the pooled buffer in place (ndarray.var() would
+        allocate a full-frame temporary).
+        """
+        dst = self.pool.get("laplacian", self.gray.shape, np.float32) if self.pool else None
+        lap = cv2.Laplacian(self.gray, cv2.CV_32F, dst=dst)
+        return float(cv2.meanStdDev(lap)[1][0, 0] ** 2)
+
+    @cached_property
+    def histogram(self):
+        """256-bin luma histogram of the decimated image."""
+        return cv2.calcHist([self.small], [0], None, [256], [0, 256]).ravel()
@@ -0,0 +1,102 @@
+# analytics.py
+# Revenue and utilization reports from the session ledger's rollups.
+#
+# ledger.py keeps per-day and per-hour sums up to date as sessions are
+# recorded, so a report over a weekend or a whole season reads one row per
+# day (and per hour for the peak) whatever the number of sessions.
+#
+#   python analytics.py                          last 7 days
+#   python analytics.py --from 2026-10-10 --to 2026-10-11 --days
+#   python analytics.py --all --peak 10          the whole season
+import argparse
+from datetime import date, timedelta
+
+import ledger
+
+
+def period(days=7, today=None):
+    """(first_day, last_day) strings for the last `days` days including today."""
+    today = today or date.today()
+    return (today - timedelta(days=days - 1)).isoformat(), today.isoformat()
+
+
+def summarize(rows):
+    """Totals and averages over rollup_day rows."""
+    total = {k: sum(r[k] for r in rows) for k in (
+        "sessions", "failed", "revenue", "duration_sum", "idle_sum", "idle_count",
+        "latency_sum", "latency_count"
+    )}
+    sessions = total["sessions"]
+    return {
+        "days": len(rows),
+        "sessions": sessions,
+        "failed": total["failed"],
+        "revenue": round(total["revenue"], 2),
+        "avg_duration": round(total["duration_sum"] / sessions, 1) if sessions else 0.0,
+        "avg_idle": round(total["idle_sum"] / total["idle_count"], 1) if total["idle_count"] else 0.0,
+        "max_idle": round(max((r["idle_max"] for r in rows), default=0.0), 1),
+        "avg_latency": round(total["latency_sum"] / total["latency_count"], 1) if total["latency_count"] else None,
+    }
+
+
+def report(first_day=None, last_day=None, peak=3):
+    """Summary, per-day rows and the busiest hours for a day range (inclusive)."""
+    days = ledger.day_rollups(first_day, last_day)
+    hours = ledger.hour_rollups(first_day, last_day)
+    busiest = sorted(hours, key=lambda h: (h["sessions"], h["revenue"]), reverse=True)[:peak]
+    return {"summary": summarize(days), "days": days, "peak_hours": busiest}
+
+
+def _minutes(seconds):
+    return f"{seconds / 60:.1f} min" if seconds >= 60 else f"{seconds:.0f} s"
+
+
+def format_report(rep, first_day=None, last_day=None, per_day=False):
+    """Plain-text report (the CLI output and the admin window's view)."""
+    s = rep["summary"]
+    latency = "n/a" if s["avg_latency"] is None else f"avg {s['avg_latency']} s"
+    span = f"{first_day or 'start'} .. {last_day or 'today'}"
+    lines = [
+        f"Sessions {span}",
+        f"  revenue        KES {s['revenue']:,.2f}",
+        f"  sessions       {s['sessions']} ({s['failed']} failed) over {s['days']} active days",
+        f"  avg duration   {s['avg_duration']} s",
+        f"  idle gaps      avg {_minutes(s['avg_idle'])}, longest {_minutes(s['max_idle'])}",
+        f"  pay -> start   {latency}",
+    ]
+    if rep["peak_hours"]:
+        lines.append("  peak hours")
+        for h in rep["peak_hours"]:
+            lines.append(f"    {h['hour']}:00  {h['sessions']} sessions/h  KES {h['revenue']:,.2f}")
+    if per_day:
+        lines.append("  per day")
+        for d in rep["days"]:
+            lines.append(f"    {d['day']}  {d['sessions']:4d} sessions  KES {d['revenue']:10,.2f}"
+                         f"  avg {d['duration_sum'] / d['sessions'] if d['sessions'] else 0:.1f} s")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Booth revenue and utilization report")
+    parser.add_argument("--from", dest="first_day", help="first day, YYYY-MM-DD")
+    parser.add_argument("--to", dest="last_day", help="last day, YYYY-MM-DD (inclusive)")
+    parser.add_argument("--recent", type=int, default=7, help="last N days (without --from/--to)")
+    parser.add_argument("--all", action="store_true", help="everything in the ledger")
+    parser.add_argument("--peak", type=int, default=3, help="busiest hours to list")
+    parser.add_argument("--days", action="store_true", help="list every day")
+    parser.add_argument("--rebuild", action="store_true", help="recompute the rollups from the sessions first")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        ledger.rebuild()
+    if args.all:
+        first, last = None, None
+    elif args.first_day or args.last_day:
+        first, last = args.first_day, args.last_day
+    else:
+        first, last = period(args.recent)
+    print(format_report(report(first, last, args.peak), first, last, args.days))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# bench_alloc.py
+# Allocation churn of the per-frame processing ops with and without a
+# FramePool. Uses tracemalloc, which sees numpy/OpenCV output arrays.
+# Also times the frame analysis alone: the old per-stage conversions
+# against one shared FrameAnalysis.
+#
+#   python bench_alloc.py [--frames 100]
+import argparse
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from analysis import FrameAnalysis
+from exposure import gain_lut
+from framepool import FramePool
+
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080)}
+SHARPEN_KERNEL = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
+PAN = np.float32([[1, 0, -12], [0, 1, -8]])
+
+
+def process(frame, pool):
+    """The record-loop ops: luma, stats, pan, LUT gain, sharpen, crop + resize."""
+    h, w = frame.shape[:2]
+    dst = (lambda name: pool.like(name, frame)) if pool else (lambda name: None)
+
+    analysis = FrameAnalysis(frame, pool)
+    _ = analysis.gray, analysis.brightness, analysis.sharpness
+
+    frame = cv2.warpAffine(frame, PAN, (w, h), dst=dst("center"), borderMode=cv2.BORDER_REPLICATE)
+    frame = cv2.LUT(frame, gain_lut(1.06), dst=dst("brightness"))
+    frame = cv2.filter2D(frame, -1, SHARPEN_KERNEL, dst=dst("focus"))
+
+    size = min(w, h) // 2
+    crop = frame[h // 4:h // 4 + size, w // 4:w // 4 + size]
+    return cv2.resize(crop, (w, h), dst=pool.get("crop", (h, w, 3)) if pool else None)
+
+
+def analyze_per_stage(frame):
+    """The old analysis: every stage converts to gray on its own."""
+    brightness = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY).mean()
+    sharpness = cv2.Laplacian(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), cv2.CV_64F).var()
+    cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)   # the face-detection input
+    return brightness, sharpness
+
+
+def analyze_shared(frame, pool):
+    analysis = FrameAnalysis(frame, pool)
+    return analysis.gray, analysis.brightness, analysis.sharpness
+
+
+def time_analysis(frames, fn):
+    """ms/frame for one analysis function."""
+    start = time.perf_counter()
+    for frame in frames:
+        fn(frame)
+    return (time.perf_counter() - start) * 1000 / len(frames)
+
+
+def measure(frames, pool):
+    """Total MB allocated across all frames, and ms/frame."""
+    tracemalloc.start()
+    total = 0
+    start = time.perf_counter()
+    for frame in frames:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        process(frame, pool)
+        total += tracemalloc.get_traced_memory()[1] - before
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    return total / 1e6, elapsed * 1000 / len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frame buffer pool allocation benchmark")
+    parser.add_argument("--frames", type=int, default=100)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'res':<6} {'alloc MB/frame':>15} {'pooled MB/frame':>16} {'ms/frame':>9} {'pooled ms':>10}")
+    for name, (w, h) in RESOLUTIONS.items():
+        frames = [rng.integers(0, 255, (h, w, 3), dtype=np.uint8) for _ in range(4)]
+        frames = [frames[i % len(frames)] for i in range(args.frames)]
+
+        plain_mb, plain_ms = measure(frames, None)
+        pool = FramePool()
+        process(frames[0], pool)   # warm-up: the pool allocates once per resolution
+        pooled_mb, pooled_ms = measure(frames, pool)
+
+        n = len(frames)
+        print(f"{name:<6} {plain_mb / n:>15.2f} {pooled_mb / n:>16.2f} {plain_ms:>9.1f} {pooled_ms:>10.1f}")
+
+    print(f"\n{'res':<6} {'per-stage ms':>13} {'shared ms':>10} {'speedup':>8}")
+    for name, (w, h) in RESOLUTIONS.items():
+        frames = [rng.integers(0, 255, (h, w, 3), dtype=np.uint8) for _ in range(4)]
+        frames = [frames[i % len(frames)] for i in range(args.frames)]
+        pool = FramePool()
+        analyze_shared(frames[0], pool)
+        old_ms = time_analysis(frames, analyze_per_stage)
+        new_ms = time_analysis(frames, lambda f: analyze_shared(f, pool))
+        print(f"{name:<6} {old_ms:>13.2f} {new_ms:>10.2f} {old_ms / new_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# bench_detect.py
+# Compares full-frame detection (originally detectMultiScale(gray, 1.3, 5))
+# against the downscaled and ROI-limited detection modes in detection.py.
+#
+#   python bench_detect.py                      # synthetic frames
+#   python bench_detect.py --video videos/x.mp4 # frames from a recorded session
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from detection import detect_faces, widen_box, DEFAULT_DETECT_SCALE, DEFAULT_ROI_MARGIN
+from face_detectors import create_detector, BACKENDS, HAAR
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080)}
+
+
+def load_frames(video, count):
+    """Grayscale frames from a video, or textured noise if none is given."""
+    frames = []
+    if video:
+        cap = cv2.VideoCapture(video)
+        while len(frames) < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+        cap.release()
+    if not frames:
+        rng = np.random.default_rng(0)
+        for _ in range(count):
+            noise = rng.integers(0, 255, (270, 480), dtype=np.uint8)
+            frames.append(cv2.GaussianBlur(noise, (5, 5), 0))
+    return frames
+
+
+def time_per_frame(fn, frames, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for gray in frames:
+            fn(gray)
+    return (time.perf_counter() - start) * 1000 / (repeat * len(frames))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Face detection ms/frame benchmark")
+    parser.add_argument("--video", help="recorded session to take frames from")
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scale", type=float, default=DEFAULT_DETECT_SCALE)
+    parser.add_argument("--backend", choices=BACKENDS, default=HAAR)
+    args = parser.parse_args()
+
+    detector = create_detector(args.backend)
+
+    source = load_frames(args.video, args.frames)
+    print(f"{'res':<6} {'full (ms)':>10} {'scaled (ms)':>12} {'roi (ms)':>10} {'saved':>8}")
+
+    for name, (w, h) in RESOLUTIONS.items():
+        frames = [cv2.resize(g, (w, h)) for g in source]
+        # Typical booth framing: a face about a quarter of the frame height, centred
+        face = (w // 2 - h // 8, h // 2 - h // 8, h // 4, h // 4)
+        roi = widen_box(face, DEFAULT_ROI_MARGIN, w, h)
+
+        full = time_per_frame(detector.detect, frames, args.repeat)
+        scaled = time_per_frame(lambda g: detect_faces(detector, g, args.scale), frames, args.repeat)
+        roi_ms = time_per_frame(lambda g: detect_faces(detector, g, args.scale, roi), frames, args.repeat)
+
+        print(f"{name:<6} {full:>10.1f} {scaled:>12.1f} {roi_ms:>10.1f} {full - roi_ms:>7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# bench_detect_pool.py
+# Detection throughput of the recording pipeline with 1..N process workers
+# (ParallelDetector + in-order reassembly), fed as fast as frames can be read.
+#
+#   python bench_detect_pool.py                       # synthetic 720p frames
+#   python bench_detect_pool.py --video videos/x.mp4  # frames from a recorded session
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from detection import ParallelDetector, DEFAULT_DETECT_SCALE
+from face_detectors import create_detector, BACKENDS, HAAR
+from pipeline import RecordingPipeline, BLOCK
+
+
+def load_frames(video, count, size):
+    """BGR frames from a video, or textured noise if none is given."""
+    frames = []
+    if video:
+        cap = cv2.VideoCapture(video)
+        while len(frames) < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(cv2.resize(frame, size))
+        cap.release()
+    if not frames:
+        rng = np.random.default_rng(0)
+        w, h = size
+        noise = rng.integers(0, 255, (h // 4, w // 4, 3), dtype=np.uint8)
+        frames = [cv2.resize(cv2.GaussianBlur(noise, (5, 5), 0), size)] * count
+    return frames
+
+
+def run(frames, workers, scale, backend):
+    """Frames/s through the pipeline and the detector stats."""
+    detector = ParallelDetector(lambda: create_detector(backend), scale)
+    source = iter(frames)
+
+    def read():
+        frame = next(source, None)
+        return (frame is not None), frame, time.time()
+
+    pipeline = RecordingPipeline(
+        read, lambda f: (f, detector.detect(f)), lambda ts, item: None,
+        duration=3600, queue_size=workers * 2, drop_policy=BLOCK,
+        process_workers=workers
+    )
+    start = time.perf_counter()
+    stats = pipeline.run()
+    elapsed = time.perf_counter() - start
+    return stats["counts"]["written"] / elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel face detection scaling benchmark")
+    parser.add_argument("--video", help="recorded session to take frames from")
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--max-workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--scale", type=float, default=DEFAULT_DETECT_SCALE)
+    parser.add_argument("--backend", choices=BACKENDS, default=HAAR)
+    args = parser.parse_args()
+
+    create_detector(args.backend)   # fail early if the model is missing
+    # Let our threads, not OpenCV's internal pool, provide the parallelism
+    cv2.setNumThreads(1)
+
+    frames = load_frames(args.video, args.frames, (args.width, args.height))
+    print(f"{len(frames)} frames {args.width}x{args.height}, detect scale {args.scale}")
+    print(f"{'workers':>7} {'fps':>8} {'ms/frame':>9} {'speedup':>8} {'reorder max':>12}")
+
+    base = None
+    for workers in range(1, args.max_workers + 1):
+        fps, stats = run(frames, workers, args.scale, args.backend)
+        base = base or fps
+        print(f"{workers:>7} {fps:>8.1f} {1000 / fps:>9.1f} {fps / base:>7.2f}x {stats['reorder_max']:>12}")
+
+
+if __name__ == "__main__":
+    main()
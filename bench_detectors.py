@@ -0,0 +1,83 @@
+# bench_detectors.py
+# Speed and hit rate of each face detector backend on recorded sessions.
+# Hit rate is the share of sampled frames where at least one face was found;
+# booth sessions almost always have someone in frame, so it tracks recall,
+# including the profile views of a 360 spin.
+#
+#   python bench_detectors.py                          # every video in videos/
+#   python bench_detectors.py --dir /media/usb/videos --every 15 --backends haar yunet
+import argparse
+import os
+import time
+
+import cv2
+
+from config import VIDEO_DIR
+from detection import detect_faces, DEFAULT_DETECT_SCALE
+from face_detectors import create_detector, model_path, BACKENDS
+
+VIDEO_EXTS = (".mp4", ".avi", ".mjpeg")
+
+
+def sample_frames(folder, every, limit):
+    """Grayscale frames: every Nth frame of each video, at most `limit` overall."""
+    frames = []
+    videos = sorted(f for f in os.listdir(folder) if f.lower().endswith(VIDEO_EXTS))
+    for name in videos:
+        cap = cv2.VideoCapture(os.path.join(folder, name))
+        index = 0
+        while len(frames) < limit:
+            if not cap.grab():
+                break
+            if index % every == 0:
+                ok, frame = cap.retrieve()
+                if ok:
+                    frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+            index += 1
+        cap.release()
+        if len(frames) >= limit:
+            break
+    return frames, len(videos)
+
+
+def evaluate(detector, frames, scale):
+    """(ms/frame, hit rate) for one backend."""
+    hits = 0
+    start = time.perf_counter()
+    for gray in frames:
+        if detect_faces(detector, gray, scale):
+            hits += 1
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000 / len(frames), hits / len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Face detector backend benchmark")
+    parser.add_argument("--dir", default=VIDEO_DIR, help="folder of recorded session videos")
+    parser.add_argument("--every", type=int, default=10, help="sample every Nth frame")
+    parser.add_argument("--limit", type=int, default=500, help="max frames overall")
+    parser.add_argument("--scale", type=float, default=DEFAULT_DETECT_SCALE)
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dir):
+        raise SystemExit(f"No such folder: {args.dir}")
+    frames, videos = sample_frames(args.dir, max(1, args.every), args.limit)
+    if not frames:
+        raise SystemExit(f"No readable videos in {args.dir}")
+    h, w = frames[0].shape[:2]
+    print(f"{len(frames)} frames from {videos} videos ({w}x{h}), detect scale {args.scale}")
+    print(f"{'backend':<8} {'ms/frame':>9} {'hit rate':>9}  model")
+
+    for backend in args.backends:
+        path = model_path(backend)
+        if not os.path.exists(path):
+            print(f"{backend:<8} {'-':>9} {'-':>9}  missing {path}")
+            continue
+        detector = create_detector(backend)
+        ms, rate = evaluate(detector, frames, args.scale)
+        print(f"{backend:<8} {ms:>9.1f} {rate:>9.0%}  {os.path.basename(detector.path)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# bench_startup.py
+# Cold-start budget for main.py: time from launch to the first painted
+# window, plus an -X importtime breakdown of what was imported on the way.
+# main.py exits right after the first paint when BOOTH_STARTUP_PROBE is set.
+#
+# Exits non-zero when the budget is exceeded or when a heavy subsystem is
+# imported before the first paint, so it can gate a deploy:
+#
+#   python bench_startup.py                  # needs a display (DISPLAY=:0 on the Pi)
+#   python bench_startup.py --budget-ms 1500 --runs 5
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from config import BASE_DIR
+
+DEFAULT_BUDGET_MS = 2000
+DEFAULT_IMPORT_BUDGET_MS = 400
+# Must not be imported before the window is on screen (main.warm_up loads them)
+HEAVY_MODULES = ("cv2", "numpy", "pygame", "yt_dlp", "selenium", "pyautogui", "requests", "smtplib")
+MARKER = "FIRST_PAINT "
+TIMEOUT = 60
+
+
+def launch(importtime=False):
+    """Run main.py in probe mode: (ms to first paint, modules loaded, stderr)."""
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + [os.path.join(BASE_DIR, "main.py")]
+    env = dict(os.environ, BOOTH_STARTUP_PROBE="1")
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=BASE_DIR, env=env, text=True,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        stdout, stderr = proc.communicate(timeout=TIMEOUT)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        raise SystemExit("main.py did not reach the first paint")
+    elapsed = None
+    loaded = []
+    for line in stdout.splitlines():
+        if line.startswith(MARKER):
+            elapsed = (time.perf_counter() - start) * 1000
+            loaded = json.loads(line[len(MARKER):])
+    if elapsed is None:
+        sys.stderr.write(stderr[-2000:])
+        raise SystemExit(2)
+    return elapsed, loaded, stderr
+
+
+def parse_importtime(stderr):
+    """{top-level module: cumulative ms} from -X importtime output."""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name[1:].rstrip()
+        if not name.startswith(" "):   # not nested: imported by main.py itself (or site)
+            totals[name] = totals.get(name, 0) + int(cumulative) / 1000
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="main.py cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="median time to first paint")
+    parser.add_argument("--import-budget-ms", type=float, default=DEFAULT_IMPORT_BUDGET_MS,
+                        help="total import time of main.py's own imports")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    launch()   # warm the OS file cache; a kiosk reboot is colder than this
+    paints = []
+    for _ in range(max(1, args.runs)):
+        ms, loaded, _ = launch()
+        paints.append(ms)
+    paint = statistics.median(paints)
+
+    _, _, stderr = launch(importtime=True)
+    imports = parse_importtime(stderr)
+    import_total = sum(imports.values())
+
+    print(f"first paint: median {paint:.0f} ms (runs: {', '.join(f'{p:.0f}' for p in paints)})"
+          f", budget {args.budget_ms:.0f} ms")
+    print(f"imports:     {import_total:.0f} ms, budget {args.import_budget_ms:.0f} ms")
+    for name, ms in sorted(imports.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"  {ms:>8.1f} ms  {name}")
+
+    failures = []
+    eager = [m for m in HEAVY_MODULES if m in loaded]
+    if eager:
+        failures.append(f"imported before first paint: {', '.join(eager)}")
+    if paint > args.budget_ms:
+        failures.append(f"first paint {paint:.0f} ms over budget")
+    if import_total > args.import_budget_ms:
+        failures.append(f"imports {import_total:.0f} ms over budget")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
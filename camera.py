@@ -0,0 +1,518 @@
+# camera.py
+# Process-wide camera manager. One owner opens the device once, keeps it warm
+# and fans frames out to any number of subscribers (preview, recording,
+# replay), so nothing pays the open/auto-exposure cost per session and the
+# preview no longer blocks the recording from opening the camera.
+#
+# With settings["capture_process"] the device is owned by a child process
+# that decodes into a shared memory ring (capture_process.py); the manager
+# then fans out views into that ring instead of reading the device itself.
+import queue
+import threading
+import time
+from collections import deque, namedtuple
+
+import cv2
+
+from logger import log
+from settings import settings
+from pipeline import StageQueue, DROP_OLDEST
+from camera_probe import get_profile, apply_profile
+from capture_process import CaptureProcess, DEFAULT_SLOTS, POLL_INTERVAL
+
+# `image` is a decoded BGR frame, or the camera's JPEG bytes when raw is True
+Frame = namedtuple("Frame", "seq ts image raw")
+
+MAX_READ_FAILURES = 30    # consecutive failed reads before the device is reopened
+IDLE_SLEEP = 0.01
+DEVICE_CALL_TIMEOUT = 3.0  # wait for the reader thread to run a device call
+
+
+class _DeviceCall:
+    """A function to run on the reader thread, with its result."""
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.result = None
+        self.done = threading.Event()
+
+    def run(self, cap):
+        try:
+            self.result = self.fn(cap)
+        except Exception as e:
+            log(f"[CAMERA] Device call failed: {e}")
+        finally:
+            self.done.set()
+
+
+class Subscription:
+    """
+    A consumer's view of the camera: a bounded queue of Frames. read()
+    mirrors cv2.VideoCapture.read() so the loops barely change; get()/set()
+    forward camera properties to the manager.
+
+    While the manager is in raw (MJPEG passthrough) mode, frames are decoded
+    for this subscriber only if `decode` is True.
+    """
+
+    def __init__(self, manager, maxsize=2, policy=DROP_OLDEST, decode=True):
+        self.manager = manager
+        self.queue = StageQueue("camera", maxsize, policy)
+        self.decode = decode
+        self.closed = False
+
+    def read_frame(self, timeout=2.0):
+        """Next Frame, or None if the camera stopped or timed out."""
+        if self.closed:
+            return None
+        try:
+            frame = self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        return self._decoded(frame) if isinstance(frame, Frame) else None
+
+    def _decoded(self, frame):
+        if frame is None or not (frame.raw and self.decode):
+            return frame
+        image = cv2.imdecode(frame.image, cv2.IMREAD_COLOR)
+        return frame._replace(image=image, raw=False) if image is not None else None
+
+    def read(self, timeout=2.0):
+        frame = self.read_frame(timeout)
+        return (True, frame.image) if frame else (False, None)
+
+    def read_timed(self, timeout=2.0):
+        """(ok, image, capture timestamp)."""
+        frame = self.read_frame(timeout)
+        return (True, frame.image, frame.ts) if frame else (False, None, None)
+
+    def get(self, prop):
+        return self.manager.get(prop)
+
+    def set(self, prop, value):
+        return self.manager.set(prop, value)
+
+    def isOpened(self):
+        return not self.closed and self.manager.is_open()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.manager.unsubscribe(self)
+
+    # VideoCapture compatibility
+    release = close
+
+    # Called by the manager's reader thread
+    def _push(self, frame):
+        self.queue.put(frame)
+
+    def _end(self):
+        self.queue.close()
+
+
+class PrerollSubscription(Subscription):
+    """
+    Subscription backed by a fixed-size ring of the most recent frames.
+
+    Opened when the countdown starts, it keeps the last `capacity` frames
+    so that at "go" start_at() can rewind to the exact frame matching the
+    countdown's end (or a few seconds earlier for pre-roll). Reads then
+    continue from there into the live stream. The ring's size bounds the
+    memory used before and after the start.
+    """
+
+    def __init__(self, manager, capacity, decode=True):
+        self.manager = manager
+        self.closed = False
+        self.decode = decode
+        self.capacity = capacity
+        self._frames = deque(maxlen=capacity)
+        self._cond = threading.Condition()
+        self._ended = False
+        self.discarded = 0
+
+    def start_at(self, ts):
+        """Drop buffered frames captured before `ts`; returns frames kept."""
+        with self._cond:
+            while self._frames and self._frames[0].ts < ts:
+                self._frames.popleft()
+                self.discarded += 1
+            return len(self._frames)
+
+    def read_frame(self, timeout=2.0):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._frames or self._ended or self.closed, timeout):
+                return None
+            frame = self._frames.popleft() if self._frames else None
+        return self._decoded(frame)
+
+    def _push(self, frame):
+        if self.manager.shared:
+            # Ring slots are reused within a few frames; the pre-roll keeps
+            # frames for seconds, so it holds its own copies.
+            frame = frame._replace(image=frame.image.copy())
+        with self._cond:
+            self._frames.append(frame)
+            self._cond.notify()
+
+    def _end(self):
+        with self._cond:
+            self._ended = True
+            self._cond.notify_all()
+
+
+class CameraManager:
+    """Owns one cv2.VideoCapture and a reader thread that feeds subscribers."""
+
+    def __init__(self, index=0):
+        self.index = index
+        self.size = None
+        self.profile = None
+        self.raw = False
+        self.seq = 0
+        self._cap = None
+        self._proc = None
+        self._lock = threading.RLock()
+        self._subs = []
+        self._thread = None
+        self._running = False
+        self._calls = queue.Queue()   # _DeviceCalls for the reader thread
+
+    #Device
+    def is_open(self):
+        if self._proc is not None:
+            return self._proc.is_alive()
+        return self._cap is not None and self._cap.isOpened()
+
+    @property
+    def shared(self):
+        """True when frames are views into the capture process's ring."""
+        return self._proc is not None
+
+    def _open_device(self):
+        """
+        Open the device with the cached capture profile for the camera_type
+        setting (see camera_probe.py), or OpenCV's defaults if none exists.
+        """
+        profile = get_profile(settings.get("camera_type", "webcam"))
+        index = profile["device"] if profile else self.index
+        cap = cv2.VideoCapture(index)
+        if cap.isOpened():
+            if profile:
+                apply_profile(cap, profile)
+            else:
+                cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.profile = profile
+        return cap
+
+    def open(self):
+        """Open the device (if needed) and start the reader thread."""
+        with self._lock:
+            if self.is_open():
+                return True
+            if settings.get("capture_process", False) and self._open_process():
+                loop = self._loop_process
+            else:
+                cap = self._open_device()
+                if not cap.isOpened():
+                    log("❌ Webcam not available")
+                    return False
+                self._cap = cap
+                self.size = (
+                    int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                    int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                )
+                loop = self._loop
+            self._running = True
+            self._thread = threading.Thread(target=loop, name="camera", daemon=True)
+            self._thread.start()
+            mode = f"{self.profile['fourcc']} profile" if self.profile else "no profile, run camera_probe.py"
+            where = ", capture process" if self._proc else ""
+            log(f"Camera opened ({self.size[0]}x{self.size[1]}, {mode}{where})")
+            return True
+
+    def _open_process(self):
+        profile = get_profile(settings.get("camera_type", "webcam"))
+        proc = CaptureProcess(
+            profile["device"] if profile else self.index, profile,
+            int(settings.get("capture_ring_slots", DEFAULT_SLOTS))
+        )
+        if not proc.start():
+            log("[CAMERA] Capture process failed to start, capturing in-process")
+            proc.close()
+            return False
+        self._proc = proc
+        self.profile = profile
+        self.size = proc.size
+        return True
+
+    def close(self):
+        """Stop the reader thread and release the device."""
+        with self._lock:
+            self._running = False
+            thread = self._thread
+            self._thread = None
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout=2)
+        with self._lock:
+            if self._proc is not None:
+                self._proc.close()
+                self._proc = None
+                log("Camera released (capture process stopped)")
+            if self._cap is not None:
+                self._cap.release()
+                self._cap = None
+                log("Camera released")
+            for sub in self._subs:
+                sub._end()
+        self._run_calls(None)   # nobody will run them now
+
+    def _on_device(self, fn, default=None):
+        """
+        Run fn(cap) on the thread that reads the device and return its
+        result (`default` if there is no device or the call fails). V4L2
+        does not allow changing the format or controls while another thread
+        is inside read(), so all device access goes through the reader.
+        """
+        with self._lock:
+            cap, thread = self._cap, self._thread
+        if cap is None:
+            return default
+        if thread is None or not thread.is_alive() or thread is threading.current_thread():
+            # No reader running (or we are it): nothing else uses the device
+            call = _DeviceCall(fn)
+            call.run(cap)
+            return default if call.result is None else call.result
+        call = _DeviceCall(fn)
+        self._calls.put(call)
+        if not call.done.wait(DEVICE_CALL_TIMEOUT):
+            log("[CAMERA] Device call timed out")
+            return default
+        return default if call.result is None else call.result
+
+    def _run_calls(self, cap):
+        """Reader thread: apply queued device calls between frames."""
+        while True:
+            try:
+                call = self._calls.get_nowait()
+            except queue.Empty:
+                return
+            if cap is None:
+                call.done.set()
+            else:
+                call.run(cap)
+
+    def _reopen(self):
+        log("[CAMERA] Too many read failures, reopening device")
+        with self._lock:
+            if self._cap is not None:
+                self._cap.release()
+            self._cap = self._open_device()
+            # The new capture decodes again; passthrough has to be re-negotiated
+            if self.raw and not (self._cap.isOpened() and self._enable_raw(self._cap)):
+                self.raw = False
+                log("[CAMERA] MJPEG passthrough lost on reopen")
+
+    def _enable_raw(self, cap):
+        """Ask for MJPG without conversion and check the first frame is a JPEG."""
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+        cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+        ok, data = cap.read()
+        if not ok or data.ndim != 2 or data.shape[0] != 1 or data.ravel()[:2].tolist() != [0xFF, 0xD8]:
+            cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+            return False
+        return True
+
+    def set_raw(self, raw):
+        """
+        Switch MJPEG passthrough on or off. In raw mode the camera is asked
+        for MJPG and OpenCV's conversion is disabled (CAP_PROP_CONVERT_RGB=0),
+        so frames arrive as the camera's own JPEG bytes. Returns whether the
+        mode is active (the backend/camera may not support it).
+
+        The switch and the check of its first frame run on the reader
+        thread, between two reads; this call waits for the outcome.
+        """
+        with self._lock:
+            if self._cap is None or raw == self.raw:
+                # (the capture process always decodes into its ring)
+                return raw == self.raw
+
+        def switch(cap):
+            if raw:
+                if not self._enable_raw(cap):
+                    log("[CAMERA] MJPEG passthrough not supported by this camera/backend")
+                    return False
+            else:
+                cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+                if self.profile:
+                    apply_profile(cap, self.profile)
+            self.raw = raw
+            log(f"[CAMERA] MJPEG passthrough {'on' if raw else 'off'}")
+            return True
+
+        return self._on_device(switch, default=False)
+
+    def get(self, prop):
+        """Camera property, read on the reader thread (or by the capture process)."""
+        if self._proc is not None:
+            return self._proc.get(prop)
+        return self._on_device(lambda cap: cap.get(prop), default=0.0)
+
+    def set(self, prop, value):
+        """
+        Set a camera property (exposure control, preview autofocus...). Like
+        get(), it is applied by the reader thread between reads.
+        """
+        if self._proc is not None:
+            return self._proc.set(prop, value)
+        return bool(self._on_device(lambda cap: cap.set(prop, value), default=False))
+
+    #Reader
+    def _loop(self):
+        failures = 0
+        while self._running:
+            with self._lock:
+                cap = self._cap
+                subs = list(self._subs)
+                raw = self.raw
+            if cap is None:
+                break
+            self._run_calls(cap)
+            raw = self.raw
+
+            if not subs:
+                # Nobody is watching: keep the stream (and auto exposure)
+                # running without paying for the decode.
+                ok = cap.grab()
+                frame = None
+            else:
+                ok, image = cap.read()
+                frame = Frame(self.seq + 1, time.time(), image, raw) if ok else None
+
+            if not ok:
+                failures += 1
+                if failures >= MAX_READ_FAILURES:
+                    self._reopen()
+                    failures = 0
+                time.sleep(IDLE_SLEEP)
+                continue
+            failures = 0
+
+            if frame is not None:
+                self.seq = frame.seq
+                for sub in subs:
+                    sub._push(frame)
+
+    def _loop_process(self):
+        """Reader for capture-process mode: watch the child, fan out its frames."""
+        proc = self._proc
+        while self._running:
+            with self._lock:
+                subs = list(self._subs)
+
+            if not proc.is_alive() or proc.stalled():
+                state = "stalled" if proc.is_alive() else "exited"
+                log(f"[CAMERA] Capture process {state}, restarting")
+                if not proc.restart():
+                    log("❌ Capture process could not be restarted")
+                    time.sleep(1.0)
+                continue
+
+            # Only decode into the ring while someone is watching
+            proc.set_streaming(bool(subs))
+            frames = proc.poll()
+            if not frames:
+                time.sleep(POLL_INTERVAL)
+                continue
+            for seq, ts, image in frames:
+                frame = Frame(seq, ts, image, False)
+                self.seq = seq
+                for sub in subs:
+                    sub._push(frame)
+
+    def capture_status(self):
+        """Status of the capture process (fps, frames, restarts, lost), or None."""
+        return self._proc.status() if self._proc is not None else None
+
+    #Subscriptions
+    def subscribe(self, maxsize=2, policy=DROP_OLDEST, decode=True):
+        """Open the camera if needed and return a Subscription, or None."""
+        if not self.open():
+            return None
+        sub = Subscription(self, maxsize, policy, decode)
+        with self._lock:
+            self._subs.append(sub)
+        return sub
+
+    def delivery_fps(self):
+        """
+        Rate the camera actually delivers frames at: the probed profile's
+        measured fps, else what the driver negotiated (0.0 if unknown).
+        """
+        if self.profile and self.profile.get("measured_fps"):
+            return float(self.profile["measured_fps"])
+        return float(self.get(cv2.CAP_PROP_FPS) or 0.0)
+
+    def subscribe_preroll(self, seconds, fps, max_mb, decode=True):
+        """
+        Open the camera if needed and return a PrerollSubscription holding
+        `seconds` of frames at `fps`, or at the camera's delivery rate if
+        that is higher (the ring fills at the rate frames arrive), capped at
+        `max_mb` of frame memory.
+        """
+        if not self.open():
+            return None
+        fps = max(fps, self.delivery_fps())
+        w, h = self.size
+        frame_mb = w * h * 3 / 1e6
+        if self.raw and not decode:
+            frame_mb /= 10   # typical MJPEG compression
+        capacity = max(1, min(int(seconds * fps) + 1, int(max_mb / frame_mb)))
+        sub = PrerollSubscription(self, capacity, decode)
+        with self._lock:
+            self._subs.append(sub)
+        log(f"[CAMERA] Pre-roll buffer: {capacity} frames at {fps:g} fps ({capacity * frame_mb:.0f} MB max)")
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            if sub in self._subs:
+                self._subs.remove(sub)
+            idle = not self._subs
+        if idle and not settings.get("camera_keep_warm", True):
+            self.close()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_camera():
+    """The process-wide CameraManager."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = CameraManager(0)
+        return _manager
+
+
+def warm_up():
+    """Open the camera ahead of the first session (call from a thread)."""
+    if settings.get("camera_keep_warm", True):
+        get_camera().open()
+
+
+def _keep_warm_changed(key, value, old):
+    # Apply the admin's choice now instead of at the next session
+    if value:
+        threading.Thread(target=warm_up, name="camera-warm-up", daemon=True).start()
+    elif _manager is not None:
+        with _manager._lock:
+            idle = not _manager._subs
+        if idle:
+            _manager.close()
+
+
+settings.subscribe("camera_keep_warm", _keep_warm_changed)
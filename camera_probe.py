@@ -0,0 +1,184 @@
+# camera_probe.py
+# Camera capability probe. Lists the formats/resolutions/frame rates the
+# camera supports, measures the fps each one really delivers, and caches the
+# best one as a named capture profile that camera.py applies at open time.
+#
+#   python camera_probe.py                 # probe device 0, save as settings["camera_type"]
+#   python camera_probe.py --name back --device 1
+#   python camera_probe.py --list          # show cached profiles
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import time
+
+import cv2
+
+from config import BASE_DIR
+from logger import log
+
+PROFILES_FILE = os.path.join(BASE_DIR, "camera_profiles.json")
+
+# Tried when v4l2-ctl is not installed
+FALLBACK_MODES = [
+    (fourcc, w, h, 30)
+    for fourcc in ("MJPG", "YUYV")
+    for (w, h) in ((1920, 1080), (1280, 720), (640, 480))
+]
+MEASURE_SECONDS = 2.0
+WARMUP_FRAMES = 5
+
+
+#Profiles
+def load_profiles():
+    if not os.path.exists(PROFILES_FILE):
+        return {}
+    try:
+        with open(PROFILES_FILE, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        log(f"[CAMERA] Failed to load camera profiles: {e}")
+        return {}
+
+
+def save_profile(name, profile):
+    profiles = load_profiles()
+    profiles[name] = profile
+    tmp = PROFILES_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(profiles, f, indent=4)
+    os.replace(tmp, PROFILES_FILE)
+
+
+def get_profile(name):
+    """Cached profile for `name` (the camera_type setting), or None."""
+    return load_profiles().get(name)
+
+
+def apply_profile(cap, profile):
+    """Apply a capture profile to an open VideoCapture. FOURCC must go first."""
+    if not profile:
+        return
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*profile["fourcc"]))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, profile["width"])
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, profile["height"])
+    cap.set(cv2.CAP_PROP_FPS, profile["fps"])
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, profile.get("buffersize", 1))
+
+
+#Probing
+def list_modes(device):
+    """(fourcc, width, height, fps) tuples the device advertises."""
+    if not shutil.which("v4l2-ctl"):
+        return list(FALLBACK_MODES)
+    try:
+        out = subprocess.run(
+            ["v4l2-ctl", "-d", f"/dev/video{device}", "--list-formats-ext"],
+            capture_output=True, text=True, timeout=10
+        ).stdout
+    except Exception as e:
+        log(f"[CAMERA] v4l2-ctl failed: {e}")
+        return list(FALLBACK_MODES)
+
+    modes = []
+    fourcc = size = None
+    for line in out.splitlines():
+        m = re.search(r"\[\d+\]: '(\w{4})'", line)
+        if m:
+            fourcc = m.group(1)
+            continue
+        m = re.search(r"Size: Discrete (\d+)x(\d+)", line)
+        if m:
+            size = (int(m.group(1)), int(m.group(2)))
+            continue
+        m = re.search(r"\(([\d.]+) fps\)", line)
+        if m and fourcc and size:
+            modes.append((fourcc, size[0], size[1], float(m.group(1))))
+    return sorted(set(modes)) or list(FALLBACK_MODES)
+
+
+def measure(device, fourcc, width, height, fps, seconds=MEASURE_SECONDS):
+    """Open the camera in one mode and return the profile with its real fps."""
+    profile = {
+        "device": device, "fourcc": fourcc, "width": width, "height": height,
+        "fps": fps, "buffersize": 1,
+    }
+    cap = cv2.VideoCapture(device)
+    if not cap.isOpened():
+        return None
+    try:
+        apply_profile(cap, profile)
+        got = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        if got != (width, height):
+            return None
+        for _ in range(WARMUP_FRAMES):
+            cap.read()
+        frames = 0
+        start = time.time()
+        while time.time() - start < seconds:
+            ret, _ = cap.read()
+            if not ret:
+                return None
+            frames += 1
+        profile["measured_fps"] = round(frames / (time.time() - start), 1)
+        return profile
+    finally:
+        cap.release()
+
+
+def pick_best(results, target_fps):
+    """Largest resolution that keeps ~target fps, else the fastest mode."""
+    smooth = [p for p in results if p["measured_fps"] >= 0.9 * target_fps]
+    if smooth:
+        return max(smooth, key=lambda p: (p["width"] * p["height"], p["measured_fps"], p["fourcc"] == "MJPG"))
+    return max(results, key=lambda p: p["measured_fps"]) if results else None
+
+
+def probe(device=0, target_fps=30, seconds=MEASURE_SECONDS):
+    results = []
+    for fourcc, w, h, fps in list_modes(device):
+        if fps > target_fps * 2:
+            continue
+        profile = measure(device, fourcc, w, h, fps, seconds)
+        if profile:
+            print(f"  {fourcc} {w}x{h}@{fps:g}: {profile['measured_fps']} fps")
+            results.append(profile)
+        else:
+            print(f"  {fourcc} {w}x{h}@{fps:g}: unavailable")
+    return results, pick_best(results, target_fps)
+
+
+def main():
+    import settings as booth_settings
+
+    booth_settings.load_settings()
+    settings = booth_settings.settings
+
+    parser = argparse.ArgumentParser(description="Probe the camera and cache the best capture profile")
+    parser.add_argument("--device", type=int, default=0)
+    parser.add_argument("--name", default=settings.get("camera_type", "webcam"),
+                        help="profile name (the camera_type setting)")
+    parser.add_argument("--fps", type=float, default=settings.get("record_fps", 30))
+    parser.add_argument("--seconds", type=float, default=MEASURE_SECONDS)
+    parser.add_argument("--list", action="store_true", help="show cached profiles and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, p in load_profiles().items():
+            print(f"{name}: /dev/video{p['device']} {p['fourcc']} {p['width']}x{p['height']}"
+                  f"@{p['fps']:g} (measured {p.get('measured_fps')} fps)")
+        return
+
+    print(f"Probing /dev/video{args.device}...")
+    _, best = probe(args.device, args.fps, args.seconds)
+    if not best:
+        raise SystemExit("No usable capture mode found")
+    save_profile(args.name, best)
+    print(f"Saved profile '{args.name}': {best['fourcc']} {best['width']}x{best['height']}"
+          f"@{best['fps']:g} ({best['measured_fps']} fps)")
+
+
+if __name__ == "__main__":
+    main()
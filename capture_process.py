@@ -0,0 +1,392 @@
+# capture_process.py
+# Optional out-of-process capture (settings["capture_process"]).
+#
+# A child process owns the cv2.VideoCapture and decodes every frame straight
+# into a multiprocessing.shared_memory ring, so capture timing no longer
+# depends on the GIL, Tk callbacks or the detector in the booth process.
+# The booth side reads frames as numpy views into the ring (no copy); a
+# line-based JSON control channel on the child's stdin/stdout carries
+# start/stop/status and camera property get/set. CameraManager watches the
+# child and restarts it if it dies or stops delivering frames.
+#
+#   python capture_process.py <device> [profile-json]    (started by CameraManager)
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+DEFAULT_SLOTS = 8
+START_TIMEOUT = 10.0
+COMMAND_TIMEOUT = 2.0
+STALL_TIMEOUT = 3.0       # streaming but no frame for this long -> restart
+MAX_READ_FAILURES = 30
+POLL_INTERVAL = 0.002
+
+
+class FrameRing:
+    """
+    Fixed-size ring of frames in one shared memory block.
+
+    Layout (float64 words, then frames):
+      [0]          sequence number of the newest complete frame (0 = none)
+      [1]          child heartbeat (time.time())
+      [2 + 2*i]    sequence number held by slot i (-1 while being written)
+      [3 + 2*i]    capture timestamp of slot i
+    """
+
+    HEADER = 2
+
+    def __init__(self, buf, slots, shape):
+        self.slots = slots
+        self.shape = tuple(shape)
+        words = self.HEADER + 2 * slots
+        self.meta = np.ndarray((words,), dtype=np.float64, buffer=buf)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=buf, offset=words * 8)
+
+    @classmethod
+    def nbytes(cls, slots, shape):
+        return (cls.HEADER + 2 * slots) * 8 + slots * int(np.prod(shape))
+
+    @property
+    def latest(self):
+        return int(self.meta[0])
+
+    @property
+    def heartbeat(self):
+        return float(self.meta[1])
+
+    # Writer side (child)
+    def begin(self, seq):
+        """Mark the slot for `seq` as being written and return its buffer."""
+        i = seq % self.slots
+        self.meta[self.HEADER + 2 * i] = -1
+        return self.frames[i]
+
+    def commit(self, seq, ts):
+        i = seq % self.slots
+        self.meta[self.HEADER + 2 * i + 1] = ts
+        self.meta[self.HEADER + 2 * i] = seq
+        self.meta[0] = seq
+
+    def beat(self, now):
+        self.meta[1] = now
+
+    # Reader side (booth)
+    def get(self, seq):
+        """(ts, view) for `seq`, or None if the slot was already overwritten."""
+        i = seq % self.slots
+        if int(self.meta[self.HEADER + 2 * i]) != seq:
+            return None
+        return float(self.meta[self.HEADER + 2 * i + 1]), self.frames[i]
+
+
+class CaptureProcess:
+    """
+    Booth-side handle on the capture child: starts it, owns the shared
+    memory ring and hands out new frames via poll().
+
+    Frames are views into the ring and stay valid for about `slots` frame
+    intervals; consumers that keep frames longer must copy them.
+    """
+
+    def __init__(self, device=0, profile=None, slots=DEFAULT_SLOTS):
+        self.device = device
+        self.profile = profile
+        self.slots = max(2, int(slots))
+        self.size = None
+        self.ring = None
+        self.restarts = 0
+        self.lost = 0
+        self._shm = None
+        self._proc = None
+        self._replies = queue.Queue()
+        self._lock = threading.Lock()
+        self._last_seq = 0
+        self._streaming = False
+        self._started = 0.0
+
+    #Lifecycle
+    def start(self, timeout=START_TIMEOUT):
+        """Spawn the child and attach the ring. Returns False on failure."""
+        cmd = [sys.executable, os.path.abspath(__file__), str(self.device)]
+        if self.profile:
+            cmd.append(json.dumps(self.profile))
+        self._replies = queue.Queue()
+        self._proc = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1
+        )
+        threading.Thread(target=self._read_replies, args=(self._proc, self._replies),
+                         name="capture-control", daemon=True).start()
+
+        hello = self._reply(timeout)
+        if not hello or not hello.get("ready"):
+            self._kill()
+            return False
+
+        size = (hello["width"], hello["height"])
+        if self._shm is None or size != self.size:
+            self._free_ring()
+            shape = (size[1], size[0], 3)
+            self._shm = shared_memory.SharedMemory(create=True, size=FrameRing.nbytes(self.slots, shape))
+            self.ring = FrameRing(self._shm.buf, self.slots, shape)
+            self.size = size
+        self.ring.meta[:] = 0
+        self._last_seq = 0
+        self._started = time.time()
+
+        if not self.command("ring", name=self._shm.name, slots=self.slots):
+            self._kill()
+            return False
+        if self._streaming:
+            self.command("start")
+        return True
+
+    def restart(self):
+        self.restarts += 1
+        self._kill()
+        return self.start()
+
+    def close(self):
+        if self._proc and self._proc.poll() is None:
+            self.command("exit", timeout=1.0)
+        self._kill()
+        self._free_ring()
+
+    def _kill(self):
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+        except Exception:
+            pass
+        try:
+            proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+    def _free_ring(self):
+        if self._shm is not None:
+            self.ring = None
+            try:
+                self._shm.unlink()
+                self._shm.close()
+            except Exception:
+                pass   # frames still referenced; the mapping goes with them
+            self._shm = None
+
+    #Health
+    def is_alive(self):
+        return self._proc is not None and self._proc.poll() is None
+
+    def stalled(self):
+        """No frame grabbed (heartbeat) for STALL_TIMEOUT."""
+        if self.ring is None:
+            return False
+        last = max(self.ring.heartbeat, self._started)
+        return time.time() - last > STALL_TIMEOUT
+
+    #Control channel
+    @staticmethod
+    def _read_replies(proc, replies):
+        for line in proc.stdout:
+            try:
+                replies.put(json.loads(line))
+            except ValueError:
+                pass
+        replies.put(None)
+
+    def _reply(self, timeout):
+        try:
+            return self._replies.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def command(self, cmd, timeout=COMMAND_TIMEOUT, **args):
+        """Send a command and return the child's reply dict, or None."""
+        with self._lock:
+            if not self.is_alive():
+                return None
+            while not self._replies.empty():
+                self._replies.get_nowait()   # late reply to a timed-out command
+            try:
+                self._proc.stdin.write(json.dumps(dict(args, cmd=cmd)) + "\n")
+                self._proc.stdin.flush()
+            except (BrokenPipeError, OSError):
+                return None
+            reply = self._reply(timeout)
+            return reply if reply and reply.get("ok") else None
+
+    def set_streaming(self, on):
+        """Decode into the ring (on) or just keep the camera warm (off)."""
+        if on == self._streaming:
+            return
+        self._streaming = on
+        self.command("start" if on else "stop")
+
+    def status(self):
+        reply = self.command("status")
+        if reply:
+            reply.update(restarts=self.restarts, lost=self.lost)
+        return reply
+
+    def get(self, prop):
+        reply = self.command("get", prop=prop)
+        return reply["value"] if reply else 0.0
+
+    def set(self, prop, value):
+        reply = self.command("set", prop=prop, value=value)
+        return bool(reply and reply["value"])
+
+    #Frames
+    def poll(self):
+        """New (seq, ts, view) tuples since the last call, oldest first."""
+        ring = self.ring
+        if ring is None:
+            return []
+        latest = ring.latest
+        if latest <= self._last_seq:
+            return []
+        first = self._last_seq + 1
+        if latest - first >= ring.slots - 1:
+            # Fell a whole ring behind; the oldest slots are being rewritten
+            skip = latest - ring.slots + 2
+            self.lost += skip - first
+            first = skip
+        self._last_seq = latest
+
+        frames = []
+        for seq in range(first, latest + 1):
+            item = ring.get(seq)
+            if item is None:
+                self.lost += 1
+                continue
+            frames.append((seq, item[0], item[1]))
+        return frames
+
+
+#Child process
+def _reply(**fields):
+    sys.stdout.write(json.dumps(dict(fields)) + "\n")
+    sys.stdout.flush()
+
+
+def _read_commands(commands):
+    for line in sys.stdin:
+        try:
+            commands.put(json.loads(line))
+        except ValueError:
+            pass
+    commands.put({"cmd": "exit"})
+
+
+def _attach(name):
+    """Attach to the booth's ring without letting this process unlink it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: the resource tracker would unlink it when we exit
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def child_main(device, profile=None):
+    from camera_probe import apply_profile
+
+    cap = cv2.VideoCapture(device)
+    if not cap.isOpened():
+        _reply(ready=False, error=f"cannot open /dev/video{device}")
+        return 1
+    if profile:
+        apply_profile(cap, profile)
+    else:
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    ok, first = cap.read()
+    if not ok:
+        _reply(ready=False, error="no frame from camera")
+        return 1
+    h, w = first.shape[:2]
+    _reply(ready=True, width=w, height=h)
+
+    commands = queue.Queue()
+    threading.Thread(target=_read_commands, args=(commands,), daemon=True).start()
+
+    shm = ring = None
+    streaming = False
+    seq = frames = failures = 0
+    started = time.time()
+
+    while True:
+        try:
+            msg = commands.get_nowait() if ring is not None else commands.get()
+        except queue.Empty:
+            msg = None
+
+        if msg:
+            cmd = msg.get("cmd")
+            if cmd == "ring":
+                shm = _attach(msg["name"])
+                ring = FrameRing(shm.buf, msg["slots"], (h, w, 3))
+                _reply(ok=True)
+            elif cmd == "start":
+                streaming = True
+                _reply(ok=True)
+            elif cmd == "stop":
+                streaming = False
+                _reply(ok=True)
+            elif cmd == "status":
+                elapsed = time.time() - started
+                _reply(ok=True, streaming=streaming, frames=frames, seq=seq,
+                       fps=round(frames / elapsed, 2) if elapsed else 0.0, pid=os.getpid())
+            elif cmd == "get":
+                _reply(ok=True, value=cap.get(msg["prop"]))
+            elif cmd == "set":
+                _reply(ok=True, value=bool(cap.set(msg["prop"], msg["value"])))
+            elif cmd == "exit":
+                _reply(ok=True)
+                break
+            continue
+
+        if ring is None:
+            continue
+        if streaming:
+            buf = ring.begin(seq + 1)
+            ok, image = cap.read(buf)
+            if ok and image is not buf:
+                # OpenCV reallocated (mode changed under us); copy if it fits
+                ok = image.shape == buf.shape
+                if ok:
+                    np.copyto(buf, image)
+            if ok:
+                seq += 1
+                frames += 1
+                ring.commit(seq, time.time())
+        else:
+            # Keep the stream and auto exposure running without decoding
+            ok = cap.grab()
+        if ok:
+            failures = 0
+            ring.beat(time.time())
+        else:
+            failures += 1
+            if failures >= MAX_READ_FAILURES:
+                return 2   # the booth side restarts us
+            time.sleep(0.01)
+
+    cap.release()
+    return 0
+
+
+if __name__ == "__main__":
+    _profile = json.loads(sys.argv[2]) if len(sys.argv) > 2 else None
+    sys.exit(child_main(int(sys.argv[1]), _profile))
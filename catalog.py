@@ -0,0 +1,223 @@
+# catalog.py
+# Indexed catalog of recorded videos (SQLite), so "latest video" and
+# "videos for phone X" are index lookups instead of listing and stat-ing
+# the whole videos folder. Every recording path adds a row when it starts
+# and updates it when the file is finished; transcode.py records the
+# shareable output when its job completes.
+#
+# Existing folders are imported once, the first time the catalog is opened
+# empty (see import_dir()).
+import os
+import sqlite3
+import threading
+import time
+
+from config import BASE_DIR, VIDEO_DIR
+from logger import log
+
+CATALOG_DB = os.path.join(BASE_DIR, "catalog.db")
+VIDEO_EXTS = (".mp4", ".avi", ".mjpeg")
+
+# Status values
+RECORDING = "recording"
+ENCODING = "encoding"    # recorded, background transcode pending
+READY = "ready"
+FAILED = "failed"        # transcode failed; the recorded file is still usable
+BROKEN = "broken"        # recording stopped early; the file is unusable
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    id         INTEGER PRIMARY KEY,
+    path       TEXT NOT NULL UNIQUE,   -- file as recorded
+    share_path TEXT,                   -- finished, shareable file (may equal path)
+    created    REAL NOT NULL,          -- recording start, time.time()
+    phone      TEXT,
+    status     TEXT NOT NULL,
+    duration   REAL,
+    size       INTEGER,
+    codec      TEXT,
+    proxy_path TEXT,                   -- low-res clip for quick replay
+    poster_path TEXT                   -- poster JPEG
+);
+CREATE INDEX IF NOT EXISTS videos_created ON videos (created);
+CREATE INDEX IF NOT EXISTS videos_phone ON videos (phone, created);
+CREATE INDEX IF NOT EXISTS videos_status ON videos (status, created);
+"""
+
+_COLUMNS = ("share_path", "created", "phone", "status", "duration", "size", "codec",
+            "proxy_path", "poster_path")
+
+_conn = None
+_lock = threading.Lock()
+
+
+def _db():
+    """Shared connection, opened (and the folder imported if new) on first use."""
+    global _conn
+    if _conn is None:
+        conn = sqlite3.connect(CATALOG_DB, check_same_thread=False, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _migrate(conn)
+        _conn = conn
+        if conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0] == 0:
+            import_dir(VIDEO_DIR)
+    return _conn
+
+
+def _migrate(conn):
+    """Add columns introduced after a catalog was created."""
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(videos)")}
+    for column in ("proxy_path", "poster_path"):
+        if column not in existing:
+            conn.execute(f"ALTER TABLE videos ADD COLUMN {column} TEXT")
+    conn.commit()
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+#Writes
+def add(path, phone=None, created=None, status=RECORDING, codec=None):
+    """Register a recording as it starts. Returns the row id."""
+    path = os.path.abspath(path)
+    with _lock:
+        conn = _db()
+        cur = conn.execute(
+            "INSERT OR REPLACE INTO videos (path, created, phone, status, codec) VALUES (?, ?, ?, ?, ?)",
+            (path, created or time.time(), phone, status, codec)
+        )
+        conn.commit()
+        return cur.lastrowid
+
+
+def update(path, **fields):
+    """Set columns (share_path, phone, status, duration, size, codec...) for a recording."""
+    unknown = set(fields) - set(_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown catalog columns: {', '.join(sorted(unknown))}")
+    if not fields:
+        return
+    names = sorted(fields)
+    with _lock:
+        conn = _db()
+        conn.execute(
+            f"UPDATE videos SET {', '.join(f'{n} = ?' for n in names)} WHERE path = ?",
+            [fields[n] for n in names] + [os.path.abspath(path)]
+        )
+        conn.commit()
+
+
+def finish(path, duration=None, status=READY, codec=None, **extra):
+    """
+    The recording is closed: store its duration, size, codec and status
+    (plus any other columns, e.g. proxy_path/poster_path).
+    """
+    fields = dict(extra, duration=duration, size=_file_size(path), status=status)
+    if codec:
+        fields["codec"] = codec
+    if status == READY:
+        fields["share_path"] = os.path.abspath(path)
+    update(path, **fields)
+
+
+def set_output(path, output, replaced=False):
+    """
+    A transcode of `path` finished as `output`. With `replaced` the
+    recorded file was only an intermediate and `output` takes its place.
+    """
+    output = os.path.abspath(output)
+    fields = {"share_path": output, "status": READY}
+    if replaced:
+        fields.update(size=_file_size(output), codec="h264")
+    update(path, **fields)
+    if replaced:
+        with _lock:
+            conn = _db()
+            conn.execute("UPDATE OR IGNORE videos SET path = ? WHERE path = ?", (output, os.path.abspath(path)))
+            conn.commit()
+
+
+#Queries
+def _row(row):
+    return dict(row) if row else None
+
+
+def latest(include_recording=False):
+    """Newest recording (skipping ones still being recorded or broken), or None."""
+    with _lock:
+        conn = _db()
+        if include_recording:
+            row = conn.execute("SELECT * FROM videos ORDER BY created DESC LIMIT 1").fetchone()
+        else:
+            # Walks videos_created from the newest end; only in-progress and broken rows are skipped
+            row = conn.execute(
+                "SELECT * FROM videos WHERE status NOT IN (?, ?) ORDER BY created DESC LIMIT 1",
+                (RECORDING, BROKEN)
+            ).fetchone()
+        return _row(row)
+
+
+def for_phone(phone, limit=50):
+    """Recordings for a phone number, newest first."""
+    with _lock:
+        rows = _db().execute(
+            "SELECT * FROM videos WHERE phone = ? ORDER BY created DESC LIMIT ?", (phone, limit)
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+
+def get(path):
+    with _lock:
+        return _row(_db().execute("SELECT * FROM videos WHERE path = ?", (os.path.abspath(path),)).fetchone())
+
+
+def playable(video):
+    """Best file to show or send for a catalog row: the shareable output if any."""
+    if not video:
+        return None
+    return video["share_path"] or video["path"]
+
+
+def latest_path():
+    """Shortcut used by share/replay: playable file of the newest recording."""
+    return playable(latest())
+
+
+#Import
+def import_dir(folder=VIDEO_DIR):
+    """
+    One-time import of a videos folder (called with the lock held, when the
+    catalog is created). WhatsApp copies (*_wa.mp4) become the share_path of
+    their recording, proxies and posters its proxy_path/poster_path.
+    """
+    if not os.path.isdir(folder):
+        return 0
+    names = [f for f in os.listdir(folder) if f.lower().endswith(VIDEO_EXTS)]
+    rows = []
+    for name in names:
+        if name.endswith(("_wa.mp4", "_proxy.mp4")):
+            continue
+        path = os.path.join(folder, name)
+        stem = os.path.splitext(path)[0]
+        share, proxy, poster = stem + "_wa.mp4", stem + "_proxy.mp4", stem + "_poster.jpg"
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        rows.append((path, share if os.path.exists(share) else path, st.st_mtime, READY, st.st_size,
+                     proxy if os.path.exists(proxy) else None, poster if os.path.exists(poster) else None))
+    _conn.executemany(
+        "INSERT OR IGNORE INTO videos (path, share_path, created, status, size, proxy_path, poster_path)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+    _conn.commit()
+    if rows:
+        log(f"[CATALOG] Imported {len(rows)} videos from {folder}")
+    return len(rows)
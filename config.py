@@ -4,6 +4,7 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 SETTINGS_FILE = os.path.join(BASE_DIR, "settings.json")
 SESSIONS_CSV = os.path.join(BASE_DIR, "sessions.csv")
+LOG_FILE = os.path.join(BASE_DIR, "logs", "booth.log")
 
 SELECTED_FILE = os.path.join(BASE_DIR, "selected_song.mp3")
 PREVIEW_FILE  = os.path.join(BASE_DIR, "preview_temp.mp3")
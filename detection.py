@@ -0,0 +1,269 @@
+# detection.py
+# Face detection scheduler: runs the cascade every N frames (or when the
+# tracker loses confidence) and follows the face with template matching
+# on the frames in between. When the cascade does run it works on a
+# downscaled image, limited to a region around the last known face with a
+# periodic full-frame rescan. The detector itself is any backend from
+# face_detectors.py.
+import threading
+
+import cv2
+
+from logger import log
+
+DEFAULT_DETECT_EVERY = 5
+DEFAULT_MIN_CONFIDENCE = 0.6
+SEARCH_MARGIN = 0.5   # tracker search window = box widened by 50% on each side
+
+DEFAULT_DETECT_SCALE = 0.5     # cascade input size relative to the frame
+DEFAULT_ROI_MARGIN = 1.0       # ROI = last box widened by 100% on each side
+DEFAULT_FULL_SCAN_EVERY = 10   # every Nth detection scans the whole frame
+
+
+#Downscaled / ROI detection
+def detect_faces(detector, gray, scale=1.0, roi=None):
+    """
+    Run the detector on `gray` (optionally limited to roi=(x1, y1, x2, y2))
+    shrunk by `scale`, and return the boxes in full-frame coordinates.
+    """
+    x1, y1 = 0, 0
+    if roi is not None:
+        x1, y1, x2, y2 = roi
+        gray = gray[y1:y2, x1:x2]
+
+    if scale < 1.0:
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    else:
+        small, scale = gray, 1.0
+
+    faces = detector.detect(small)
+    return [
+        (int(x / scale) + x1, int(y / scale) + y1, int(w / scale), int(h / scale))
+        for (x, y, w, h) in faces
+    ]
+
+
+def widen_box(box, margin, frame_w, frame_h):
+    """Return box widened by `margin` x its size on each side, clipped to the frame."""
+    x, y, w, h = box
+    mx, my = int(w * margin), int(h * margin)
+    return (max(x - mx, 0), max(y - my, 0), min(x + w + mx, frame_w), min(y + h + my, frame_h))
+
+
+class DetectionScheduler:
+    """
+    Returns the largest face box (x, y, w, h) for each grayscale frame.
+
+    The cascade runs on every `detect_every`-th frame. On the frames in
+    between, the last detected face is located with cv2.matchTemplate in
+    a window around its previous position. A match score below
+    `min_confidence` forces a detection on the next frame.
+
+    In "roi" mode the cascade runs on a `scale`-downscaled image and, once
+    a face is known, only inside the last box widened by `roi_margin`.
+    Every `full_scan_every`-th detection (and any ROI miss) scans the
+    whole frame so new faces are still picked up. "full" mode keeps the
+    original full-resolution, full-frame scan.
+    """
+
+    def __init__(self, detector, detect_every=DEFAULT_DETECT_EVERY,
+                 min_confidence=DEFAULT_MIN_CONFIDENCE, mode="roi",
+                 scale=DEFAULT_DETECT_SCALE, roi_margin=DEFAULT_ROI_MARGIN,
+                 full_scan_every=DEFAULT_FULL_SCAN_EVERY):
+        self.detector = detector
+        self.detect_every = max(1, int(detect_every))
+        self.min_confidence = float(min_confidence)
+        self.mode = mode
+        self.scale = float(scale) if mode == "roi" else 1.0
+        self.roi_margin = float(roi_margin)
+        self.full_scan_every = max(1, int(full_scan_every))
+
+        self.box = None
+        self._template = None
+        self._since_detect = 0
+        self._force_detect = True
+
+        self.detections = 0
+        self.roi_scans = 0
+        self.tracked = 0
+        self.lost = 0
+
+    def reset(self):
+        self.box = None
+        self._template = None
+        self._force_detect = True
+
+    def update(self, gray):
+        """Process one grayscale frame and return the face box or None."""
+        due = self._force_detect or self._since_detect >= self.detect_every - 1
+        if due or self._template is None:
+            return self._detect(gray)
+
+        box = self._track(gray)
+        if box is None:
+            # Tracker lost the face; fall back to the cascade right away
+            self.lost += 1
+            return self._detect(gray)
+
+        self._since_detect += 1
+        self.tracked += 1
+        self.box = box
+        return box
+
+    #Detection
+    def _detect(self, gray):
+        faces = []
+        use_roi = (
+            self.mode == "roi"
+            and self.box is not None
+            and (self.detections + 1) % self.full_scan_every != 0
+        )
+        if use_roi:
+            fh, fw = gray.shape[:2]
+            roi = widen_box(self.box, self.roi_margin, fw, fh)
+            faces = detect_faces(self.detector, gray, self.scale, roi)
+            self.roi_scans += 1
+        if not faces:
+            faces = detect_faces(self.detector, gray, self.scale)
+        self.detections += 1
+        self._since_detect = 0
+        self._force_detect = False
+
+        if not len(faces):
+            self.reset()
+            # No face: keep running the cascade until one shows up
+            self._force_detect = True
+            return None
+
+        x, y, w, h = (int(v) for v in max(faces, key=lambda f: f[2] * f[3]))
+        self.box = (x, y, w, h)
+        self._template = gray[y:y+h, x:x+w].copy()
+        return self.box
+
+    #Tracking
+    def _track(self, gray):
+        x, y, w, h = self.box
+        fh, fw = gray.shape[:2]
+        mx, my = int(w * SEARCH_MARGIN), int(h * SEARCH_MARGIN)
+        x1, y1 = max(x - mx, 0), max(y - my, 0)
+        x2, y2 = min(x + w + mx, fw), min(y + h + my, fh)
+
+        th, tw = self._template.shape[:2]
+        if x2 - x1 < tw or y2 - y1 < th:
+            return None
+
+        result = cv2.matchTemplate(gray[y1:y2, x1:x2], self._template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, loc = cv2.minMaxLoc(result)
+        if score < self.min_confidence:
+            return None
+        return (x1 + loc[0], y1 + loc[1], w, h)
+
+    #Stats
+    def stats(self):
+        total = self.detections + self.tracked
+        return {
+            "frames": total,
+            "detections": self.detections,
+            "tracked": self.tracked,
+            "lost": self.lost,
+            "roi_scans": self.roi_scans,
+            "detect_ratio": round(self.detections / total, 3) if total else 0.0,
+            "track_ratio": round(self.tracked / total, 3) if total else 0.0,
+        }
+
+
+class ParallelDetector:
+    """
+    Per-frame face detection that is safe to call from several threads,
+    for RecordingPipeline's parallel process stage.
+
+    Each calling thread gets its own detector from `factory` (cascades and
+    DNN nets must not be shared between threads) and grayscale buffer.
+    OpenCV releases the GIL while detecting, so N process workers keep N
+    cores busy. There is no tracking between
+    frames: each frame is detected on its own and the pipeline puts the
+    results back in order.
+
+    While `saturated()` returns True (e.g. RecordingPipeline.saturated),
+    detection is skipped and the most recent box found is reused, so a
+    backlog costs accuracy instead of dropped frames.
+    """
+
+    def __init__(self, factory, scale=DEFAULT_DETECT_SCALE, saturated=None):
+        self.factory = factory
+        self.scale = float(scale)
+        self.saturated = saturated
+        self.box = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        self.workers = 0
+        self.frames = 0
+        self.detections = 0
+        self.found = 0
+        self.skipped = 0
+
+    def _worker_state(self):
+        state = self._local
+        if not hasattr(state, "detector"):
+            state.detector = self.factory()
+            state.gray = None
+            with self._lock:
+                self.workers += 1
+        return state
+
+    def detect(self, frame):
+        """Largest face box (x, y, w, h) in a BGR frame, or None."""
+        if self.saturated is not None and self.saturated():
+            with self._lock:
+                self.frames += 1
+                self.skipped += 1
+                return self.box
+
+        state = self._worker_state()
+        if state.gray is not None and state.gray.shape != frame.shape[:2]:
+            state.gray = None
+        state.gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=state.gray)
+        faces = detect_faces(state.detector, state.gray, self.scale)
+        box = tuple(int(v) for v in max(faces, key=lambda f: f[2] * f[3])) if faces else None
+
+        with self._lock:
+            self.frames += 1
+            self.detections += 1
+            if box is not None:
+                self.found += 1
+                self.box = box
+        return box
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "detections": self.detections,
+            "found": self.found,
+            "skipped": self.skipped,
+            "workers": self.workers,
+            "skip_ratio": round(self.skipped / self.frames, 3) if self.frames else 0.0,
+        }
+
+
+def make_scheduler(detector, settings):
+    """Build a scheduler configured from the settings dict."""
+    return DetectionScheduler(
+        detector,
+        detect_every=settings.get("detect_every_n", DEFAULT_DETECT_EVERY),
+        min_confidence=settings.get("track_min_confidence", DEFAULT_MIN_CONFIDENCE),
+        mode=settings.get("detect_mode", "roi"),
+        scale=settings.get("detect_scale", DEFAULT_DETECT_SCALE),
+        roi_margin=settings.get("detect_roi_margin", DEFAULT_ROI_MARGIN),
+        full_scan_every=settings.get("full_scan_every", DEFAULT_FULL_SCAN_EVERY),
+    )
+
+
+def log_stats(scheduler, prefix="[DETECT]"):
+    s = scheduler.stats()
+    if "skipped" in s:
+        log(f"{prefix} frames={s['frames']} workers={s['workers']} found={s['found']} "
+            f"skipped={s['skip_ratio']:.0%} (pool saturated)")
+        return
+    log(f"{prefix} frames={s['frames']} detect={s['detect_ratio']:.0%} "
+        f"track={s['track_ratio']:.0%} lost={s['lost']}")
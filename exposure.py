@@ -0,0 +1,94 @@
+# exposure.py
+# Exposure control and per-frame gain for the webcam loops.
+#
+# The camera exposure (a V4L2 ioctl per get/set) is only touched a few times
+# per second, with hysteresis so it settles instead of hunting. Per-frame
+# brightness correction uses a cached 256-entry lookup table applied with
+# cv2.LUT instead of a float multiply over the whole frame.
+import time
+
+import cv2
+import numpy as np
+
+TARGET_BRIGHTNESS = 120
+DEFAULT_RATE_HZ = 2.0
+START_THRESHOLD = 25    # start adjusting exposure beyond this error
+STOP_THRESHOLD = 10     # ...and keep going until the error is below this
+EXPOSURE_STEP = 0.01
+ALPHA_STEP = 0.02       # gain quantization; one LUT per step
+SMOOTHING = 0.8         # brightness EMA weight of the previous value
+
+_luts = {}
+
+
+def gain_lut(alpha):
+    """Cached uint8 LUT for gain `alpha` (already quantized)."""
+    key = round(alpha, 3)
+    lut = _luts.get(key)
+    if lut is None:
+        lut = np.clip(np.arange(256) * key, 0, 255).astype(np.uint8)
+        _luts[key] = lut
+    return lut
+
+
+class ExposureController:
+    """
+    Keeps a smoothed brightness estimate and
+      - adjusts CAP_PROP_EXPOSURE at most `rate_hz` times per second, with
+        hysteresis between START_THRESHOLD and STOP_THRESHOLD;
+      - applies a quantized per-frame gain through a cached LUT.
+    """
+
+    def __init__(self, rate_hz=DEFAULT_RATE_HZ, target=TARGET_BRIGHTNESS):
+        self.interval = 1.0 / max(float(rate_hz), 0.1)
+        self.target = target
+        self.brightness = None
+        self.exposure = None        # last value we read/set, to skip cam.get()
+        self.adjusting = False
+        self._last_update = 0.0
+        self.updates = 0
+
+    def observe(self, brightness):
+        if self.brightness is None:
+            self.brightness = brightness
+        else:
+            self.brightness = SMOOTHING * self.brightness + (1 - SMOOTHING) * brightness
+        return self.target - self.brightness
+
+    def control(self, cam, now=None):
+        """Rate-limited exposure step. Call once per frame after observe()."""
+        now = time.time() if now is None else now
+        if self.brightness is None or now - self._last_update < self.interval:
+            return
+        self._last_update = now
+
+        diff = self.target - self.brightness
+        if abs(diff) > START_THRESHOLD:
+            self.adjusting = True
+        elif abs(diff) < STOP_THRESHOLD:
+            self.adjusting = False
+        if not self.adjusting:
+            return
+
+        if self.exposure is None:
+            self.exposure = cam.get(cv2.CAP_PROP_EXPOSURE)
+        # Same direction as the original loop: too dark -> step down
+        self.exposure += -EXPOSURE_STEP if diff > 0 else EXPOSURE_STEP
+        try:
+            cam.set(cv2.CAP_PROP_EXPOSURE, self.exposure)
+        except Exception:
+            pass
+        self.updates += 1
+
+    def gain(self):
+        """Quantized gain for the current brightness error."""
+        diff = self.target - (self.brightness if self.brightness is not None else self.target)
+        alpha = 1.0 + diff / 300
+        return round(alpha / ALPHA_STEP) * ALPHA_STEP
+
+    def apply(self, frame, dst=None):
+        """Apply the per-frame gain through the cached LUT."""
+        alpha = self.gain()
+        if alpha == 1.0:
+            return frame
+        return cv2.LUT(frame, gain_lut(alpha), dst=dst)
@@ -0,0 +1,106 @@
+# face_detectors.py
+# Face detector backends behind one small interface, chosen with
+# settings["face_detector"]:
+#
+#   haar   the original haarcascade_frontalface_default.xml cascade
+#   lbp    an LBP cascade (faster, slightly less accurate)
+#   yunet  OpenCV's YuNet CNN via cv2.FaceDetectorYN, on CPU from a local
+#          .onnx file; also finds turned and partly profile faces
+#
+# Every backend has detect(gray) -> [(x, y, w, h), ...], so the scheduler and
+# workers in detection.py do not care which one is in use. Model files are
+# looked up next to the code unless settings["face_model"] names one.
+import os
+
+import cv2
+
+from config import BASE_DIR
+from logger import log
+
+HAAR = "haar"
+LBP = "lbp"
+YUNET = "yunet"
+BACKENDS = (HAAR, LBP, YUNET)
+
+MODEL_FILES = {
+    HAAR: "haarcascade_frontalface_default.xml",
+    LBP: "lbpcascade_frontalface_improved.xml",
+    YUNET: "face_detection_yunet_2023mar.onnx",
+}
+
+YUNET_SCORE_THRESHOLD = 0.6
+YUNET_NMS_THRESHOLD = 0.3
+
+
+class CascadeDetector:
+    """Haar or LBP cascade, with the booth's original detectMultiScale parameters."""
+
+    def __init__(self, path, scale_factor=1.3, min_neighbors=5):
+        self.path = path
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.cascade = cv2.CascadeClassifier(path)
+
+    def empty(self):
+        return self.cascade.empty()
+
+    def detect(self, gray):
+        return [tuple(f) for f in self.cascade.detectMultiScale(gray, self.scale_factor, self.min_neighbors)]
+
+
+class YuNetDetector:
+    """YuNet face detector. Takes gray or BGR input; the input size follows the frame."""
+
+    def __init__(self, path, score_threshold=YUNET_SCORE_THRESHOLD):
+        self.path = path
+        self.net = None
+        self._size = None
+        if os.path.exists(path) and hasattr(cv2, "FaceDetectorYN"):
+            self.net = cv2.FaceDetectorYN.create(path, "", (320, 320), score_threshold, YUNET_NMS_THRESHOLD)
+
+    def empty(self):
+        return self.net is None
+
+    def detect(self, gray):
+        image = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR) if gray.ndim == 2 else gray
+        h, w = image.shape[:2]
+        if self._size != (w, h):
+            self.net.setInputSize((w, h))
+            self._size = (w, h)
+        _, faces = self.net.detect(image)
+        if faces is None:
+            return []
+        return [tuple(int(v) for v in f[:4]) for f in faces]
+
+
+def model_path(backend, path=None):
+    """Explicit `path`, else the backend's default model file in BASE_DIR."""
+    return path or os.path.join(BASE_DIR, MODEL_FILES[backend])
+
+
+def create_detector(backend=HAAR, path=None):
+    """
+    Build a detector for `backend`. Falls back to the Haar cascade (and
+    logs why) if the backend is unknown or its model file cannot be loaded.
+    Raises if even the Haar cascade is missing.
+    """
+    if backend not in BACKENDS:
+        log(f"[DETECT] Unknown face detector '{backend}', using {HAAR}")
+        backend, path = HAAR, None
+
+    if backend == YUNET:
+        detector = YuNetDetector(model_path(backend, path))
+    else:
+        detector = CascadeDetector(model_path(backend, path))
+
+    if detector.empty():
+        if backend == HAAR:
+            raise Exception("Haar cascade not found!")
+        log(f"[DETECT] Cannot load {backend} model {detector.path}, using {HAAR}")
+        return create_detector(HAAR)
+    return detector
+
+
+def detector_from_settings(settings):
+    """Detector chosen by settings["face_detector"] / settings["face_model"]."""
+    return create_detector(settings.get("face_detector", HAAR), settings.get("face_model") or None)
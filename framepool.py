@@ -0,0 +1,52 @@
+# framepool.py
+# Reusable frame buffers for the recording hot loops. OpenCV functions write
+# into these through their dst= argument instead of allocating a new
+# full-frame array on every call.
+import numpy as np
+
+
+class FramePool:
+    """
+    Named rings of preallocated arrays.
+
+    get(name, shape) hands out the next array of the ring for `name`,
+    (re)allocating the ring only when the shape changes, i.e. once per
+    negotiated resolution. A ring of `depth` buffers means a returned
+    array is not handed out again until `depth - 1` more calls for the
+    same name, so depth must cover every frame still in flight (queued
+    between pipeline stages or held by the writer). Scratch buffers that
+    never leave a stage can ask for depth=1.
+    """
+
+    def __init__(self, depth=2):
+        self.depth = max(1, int(depth))
+        self._rings = {}
+        self.allocations = 0
+        self.bytes_allocated = 0
+
+    def get(self, name, shape, dtype=np.uint8, depth=None):
+        shape = tuple(shape)
+        ring = self._rings.get(name)
+        if ring is None or ring["shape"] != shape or ring["dtype"] != dtype:
+            depth = max(1, int(depth or self.depth))
+            bufs = [np.empty(shape, dtype) for _ in range(depth)]
+            ring = {"shape": shape, "dtype": dtype, "bufs": bufs, "next": 0}
+            self._rings[name] = ring
+            self.allocations += depth
+            self.bytes_allocated += sum(b.nbytes for b in bufs)
+
+        bufs = ring["bufs"]
+        buf = bufs[ring["next"]]
+        ring["next"] = (ring["next"] + 1) % len(bufs)
+        return buf
+
+    def like(self, name, frame, depth=None):
+        """A pooled array with the same shape and dtype as `frame`."""
+        return self.get(name, frame.shape, frame.dtype, depth)
+
+    def stats(self):
+        return {
+            "rings": len(self._rings),
+            "allocations": self.allocations,
+            "mb": round(self.bytes_allocated / 1e6, 1),
+        }
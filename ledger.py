@@ -0,0 +1,396 @@
+# ledger.py
+# Session ledger (SQLite): one row per paid session with a fixed schema,
+# replacing sessions.csv, which had been written in three different shapes
+# (Booth.py's 6 columns, main.py's 4-column header, session.py's 4 values).
+#
+# record() never waits on the disk: rows go onto a queue and a single writer
+# thread inserts them in batches, one commit per batch (WAL mode, so readers
+# are not blocked). flush() waits until everything queued is committed.
+#
+# The same commit keeps per-day and per-hour rollups (revenue, sessions,
+# duration, idle gaps, payment-to-start latency) up to date, so reports
+# (analytics.py) read a few hundred rollup rows instead of the whole
+# history. They are rebuilt from the sessions table if missing.
+#
+# The old CSV is imported once, the first time the ledger is opened empty
+# (see import_csv()).
+import atexit
+import csv
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from config import BASE_DIR, SESSIONS_CSV
+from logger import log
+
+LEDGER_DB = os.path.join(BASE_DIR, "sessions.db")
+
+BATCH_SIZE = 64
+FLUSH_INTERVAL = 1.0    # seconds a queued row may wait for more to batch with
+
+# Status values
+COMPLETED = "completed"
+FAILED = "failed"        # paid, but the recording did not complete
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id          INTEGER PRIMARY KEY,
+    timestamp   REAL NOT NULL,          -- session end, time.time()
+    phone       TEXT,
+    song        TEXT,
+    duration    REAL,                   -- seconds recorded
+    price       REAL,
+    checkout_id TEXT,                   -- M-Pesa CheckoutRequestID
+    video_path  TEXT,
+    status      TEXT NOT NULL,
+    paid_at     REAL,                   -- payment confirmed
+    started_at  REAL                    -- recording started
+);
+CREATE INDEX IF NOT EXISTS sessions_timestamp ON sessions (timestamp);
+CREATE INDEX IF NOT EXISTS sessions_phone ON sessions (phone, timestamp);
+"""
+
+# Rollups, keyed by local day ("2026-10-17") and hour ("2026-10-17 14") of
+# the session start. Sums and counts only, so a report over any range is a
+# sum of rows; averages are taken when reporting.
+_ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup_day (
+    day           TEXT PRIMARY KEY,
+    sessions      INTEGER NOT NULL DEFAULT 0,
+    failed        INTEGER NOT NULL DEFAULT 0,
+    revenue       REAL NOT NULL DEFAULT 0,
+    duration_sum  REAL NOT NULL DEFAULT 0,
+    idle_sum      REAL NOT NULL DEFAULT 0,    -- gaps between sessions on the same day
+    idle_count    INTEGER NOT NULL DEFAULT 0,
+    idle_max      REAL NOT NULL DEFAULT 0,
+    latency_sum   REAL NOT NULL DEFAULT 0,    -- payment confirmed -> recording started
+    latency_count INTEGER NOT NULL DEFAULT 0,
+    first_start   REAL,
+    last_end      REAL
+);
+CREATE TABLE IF NOT EXISTS rollup_hour (
+    hour          TEXT PRIMARY KEY,
+    sessions      INTEGER NOT NULL DEFAULT 0,
+    revenue       REAL NOT NULL DEFAULT 0,
+    duration_sum  REAL NOT NULL DEFAULT 0
+);
+"""
+
+_COLUMNS = ("timestamp", "phone", "song", "duration", "price", "checkout_id", "video_path", "status",
+            "paid_at", "started_at")
+_INSERT = f"INSERT INTO sessions ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+
+_conn = None
+_lock = threading.Lock()
+_queue = queue.Queue()
+_writer = None
+
+
+def open_ledger():
+    """
+    Open the ledger (importing sessions.csv the first time). Called at
+    startup and before the writer thread starts, so the import never runs
+    on the writer.
+    """
+    with _lock:
+        _db()
+
+
+def _db():
+    """Shared connection, opened (and the old CSV imported if new) on first use."""
+    global _conn
+    if _conn is None:
+        conn = sqlite3.connect(LEDGER_DB, check_same_thread=False, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _migrate(conn)
+        conn.executescript(_ROLLUP_SCHEMA)
+        _conn = conn
+        if conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 0:
+            import_csv(SESSIONS_CSV)
+        if conn.execute("SELECT COUNT(*) FROM rollup_day").fetchone()[0] == 0:
+            rebuild_rollups()
+    return _conn
+
+
+def _migrate(conn):
+    """Add columns introduced after a ledger was created."""
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+    for column in ("paid_at", "started_at"):
+        if column not in existing:
+            conn.execute(f"ALTER TABLE sessions ADD COLUMN {column} REAL")
+    conn.commit()
+
+
+#Writes
+def record(phone, duration, price, song=None, checkout_id=None, video_path=None,
+           status=COMPLETED, timestamp=None, paid_at=None, started_at=None):
+    """Queue a session row; returns at once, the writer thread commits it."""
+    global _writer
+    row = (timestamp or time.time(), phone, song, duration, price, checkout_id,
+           os.path.abspath(video_path) if video_path else None, status, paid_at, started_at)
+    with _lock:
+        if _writer is None or not _writer.is_alive():
+            _db()
+            _writer = threading.Thread(target=_write_loop, name="ledger-writer", daemon=True)
+            _writer.start()
+    _queue.put(row)
+
+
+def _write_loop():
+    while True:
+        batch = [_queue.get()]
+        deadline = time.monotonic() + FLUSH_INTERVAL
+        while len(batch) < BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        try:
+            _insert(batch)
+        except Exception as e:
+            # Drop the batch rather than the writer: later sessions still get stored
+            log(f"[LEDGER] Failed to store {len(batch)} session(s): {e}")
+            for row in batch:
+                log(f"[LEDGER] Lost row: {row}")
+        finally:
+            for _ in batch:
+                _queue.task_done()
+
+
+def _insert(rows):
+    with _lock:
+        conn = _db()
+        try:
+            conn.executemany(_INSERT, rows)
+            _roll_up(conn, rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()   # nothing from a bad batch may ride along with the next commit
+            raise
+
+
+#Rollups
+def _start(row):
+    """When a session row's recording started (estimated for old rows)."""
+    timestamp, duration, started_at = row[0], row[3], row[9]
+    return started_at or timestamp - (duration or 0)
+
+
+def _roll_up(conn, rows):
+    """
+    Add session rows (tuples in _COLUMNS order) to the rollups, in the
+    caller's transaction. Idle gaps are measured from the day's last
+    session end, so they assume sessions are recorded in time order (one
+    booth); rebuild() recomputes them exactly.
+    """
+    days, hours = {}, {}
+    for row in sorted(rows, key=_start):
+        end, duration, price, status, paid_at, started_at = row[0], row[3], row[4], row[7], row[8], row[9]
+        start = _start(row)
+        local = time.localtime(start)
+        day = time.strftime("%Y-%m-%d", local)
+        hour = time.strftime("%Y-%m-%d %H", local)
+
+        d = days.get(day)
+        if d is None:
+            prev = conn.execute("SELECT last_end FROM rollup_day WHERE day = ?", (day,)).fetchone()
+            d = days[day] = {"sessions": 0, "failed": 0, "revenue": 0.0, "duration_sum": 0.0,
+                             "idle_sum": 0.0, "idle_count": 0, "idle_max": 0.0,
+                             "latency_sum": 0.0, "latency_count": 0,
+                             "first_start": start, "last_end": prev[0] if prev else None}
+        d["sessions"] += 1
+        d["failed"] += status != COMPLETED
+        d["revenue"] += price or 0
+        d["duration_sum"] += duration or 0
+        if d["last_end"] is not None and start > d["last_end"]:
+            gap = start - d["last_end"]
+            d["idle_sum"] += gap
+            d["idle_count"] += 1
+            d["idle_max"] = max(d["idle_max"], gap)
+        d["last_end"] = max(d["last_end"] or end, end)
+        if paid_at and started_at and started_at >= paid_at:
+            d["latency_sum"] += started_at - paid_at
+            d["latency_count"] += 1
+
+        h = hours.setdefault(hour, [0, 0.0, 0.0])
+        h[0] += 1
+        h[1] += price or 0
+        h[2] += duration or 0
+
+    conn.executemany(
+        """INSERT INTO rollup_day VALUES (:day, :sessions, :failed, :revenue, :duration_sum, :idle_sum,
+                                          :idle_count, :idle_max, :latency_sum, :latency_count,
+                                          :first_start, :last_end)
+           ON CONFLICT (day) DO UPDATE SET
+               sessions = sessions + excluded.sessions,
+               failed = failed + excluded.failed,
+               revenue = revenue + excluded.revenue,
+               duration_sum = duration_sum + excluded.duration_sum,
+               idle_sum = idle_sum + excluded.idle_sum,
+               idle_count = idle_count + excluded.idle_count,
+               idle_max = MAX(idle_max, excluded.idle_max),
+               latency_sum = latency_sum + excluded.latency_sum,
+               latency_count = latency_count + excluded.latency_count,
+               first_start = MIN(first_start, excluded.first_start),
+               last_end = MAX(last_end, excluded.last_end)""",
+        [dict(v, day=k) for k, v in days.items()]
+    )
+    conn.executemany(
+        """INSERT INTO rollup_hour VALUES (?, ?, ?, ?)
+           ON CONFLICT (hour) DO UPDATE SET
+               sessions = sessions + excluded.sessions,
+               revenue = revenue + excluded.revenue,
+               duration_sum = duration_sum + excluded.duration_sum""",
+        [(k, *v) for k, v in hours.items()]
+    )
+
+
+def rebuild():
+    """Recompute the rollups from every session (e.g. after editing rows by hand)."""
+    flush()
+    with _lock:
+        _db()
+        rebuild_rollups()
+
+
+def rebuild_rollups():
+    """Recompute the rollups from every session (called with the lock held)."""
+    _conn.execute("DELETE FROM rollup_day")
+    _conn.execute("DELETE FROM rollup_hour")
+    cur = _conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM sessions ORDER BY timestamp")
+    while True:
+        rows = cur.fetchmany(5000)
+        if not rows:
+            break
+        _roll_up(_conn, [tuple(r) for r in rows])
+    _conn.commit()
+
+
+def day_rollups(first_day=None, last_day=None):
+    """rollup_day rows for first_day..last_day ("YYYY-MM-DD", inclusive), oldest first."""
+    with _lock:
+        rows = _db().execute(
+            "SELECT * FROM rollup_day WHERE day >= ? AND day <= ? ORDER BY day",
+            (first_day or "", last_day or "9999")
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+
+def hour_rollups(first_day=None, last_day=None):
+    """rollup_hour rows for the hours of first_day..last_day, oldest first."""
+    with _lock:
+        rows = _db().execute(
+            "SELECT * FROM rollup_hour WHERE hour >= ? AND hour < ? ORDER BY hour",
+            (first_day or "", (last_day or "9999") + " 99")
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+
+def flush(timeout=5.0):
+    """Wait (up to `timeout`) until every queued session is committed."""
+    if _writer is None:
+        return
+    deadline = time.time() + timeout
+    while _queue.unfinished_tasks and time.time() < deadline:
+        time.sleep(0.01)
+
+
+atexit.register(flush)
+
+
+#Queries
+def recent(limit=50):
+    """Latest sessions, newest first."""
+    with _lock:
+        rows = _db().execute("SELECT * FROM sessions ORDER BY timestamp DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(r) for r in rows]
+
+
+def for_phone(phone, limit=50):
+    with _lock:
+        rows = _db().execute(
+            "SELECT * FROM sessions WHERE phone = ? ORDER BY timestamp DESC LIMIT ?", (phone, limit)
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+
+def between(start, end):
+    """Sessions with start <= timestamp < end, oldest first."""
+    with _lock:
+        rows = _db().execute(
+            "SELECT * FROM sessions WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp", (start, end)
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+
+#CSV import
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _csv_row(fields):
+    """
+    One sessions.csv line as a ledger row, or None if it is a header or
+    unreadable. Handles both shapes that were written:
+      6 fields: timestamp, phone, song_title, duration, status, amount  (Booth.py)
+      4 fields: timestamp, phone, duration, price                       (session.py)
+    """
+    fields = [f.strip() for f in fields]
+    if len(fields) not in (4, 6) or fields[0] == "timestamp":
+        return None
+    try:
+        ts = datetime.fromisoformat(fields[0]).timestamp()
+    except ValueError:
+        return None
+    if len(fields) == 6:
+        _, phone, song, duration, status, price = fields
+        status = COMPLETED if status.upper() in ("OK", "") else status.lower()
+    else:
+        _, phone, duration, price = fields
+        song, status = None, COMPLETED
+    return (ts, phone or None, song or None, _number(duration), _number(price), None, None, status, None, None)
+
+
+def import_csv(path=SESSIONS_CSV):
+    """
+    One-time import of sessions.csv (called with the lock held, when the
+    ledger is created). Each line is read by its own field count rather
+    than the header, which did not match what was appended under it;
+    headers and unreadable lines are skipped and counted.
+    """
+    if not os.path.exists(path):
+        return 0
+    rows, skipped = [], 0
+    try:
+        # Undecodable bytes only spoil their own line
+        with open(path, newline="", encoding="utf-8", errors="replace") as f:
+            for fields in csv.reader(f):
+                if not fields:
+                    continue
+                row = _csv_row(fields)
+                if row is None:
+                    if fields[0].strip() != "timestamp":
+                        skipped += 1
+                    continue
+                rows.append(row)
+    except (OSError, csv.Error) as e:
+        log(f"[LEDGER] Cannot import {path}: {e}")
+        return 0
+    _conn.executemany(_INSERT, rows)
+    _conn.commit()
+    if rows or skipped:
+        log(f"[LEDGER] Imported {len(rows)} sessions from {path}"
+            f"{f', skipped {skipped} unreadable lines' if skipped else ''}")
+    return len(rows)
@@ -1,15 +1,196 @@
 # logger.py
+# Booth log: log() only puts the message on a queue and returns, from any
+# thread. One writer thread drains the queue in batches to the console, a
+# size-rotated log file and (optionally) a JSON-lines file for analysis.
+#
+# The Tk log view is fed from the Tk thread itself: attach_view() polls the
+# lines the writer has collected with root.after, at most every
+# VIEW_INTERVAL_MS, inserts them in one go and keeps only the last N lines.
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
 from datetime import datetime
 
-_ui_callback = None
+from config import LOG_FILE
 
-def set_ui_callback(callback):
-    global _ui_callback
-    _ui_callback = callback
+QUEUE_SIZE = 10000        # messages waiting for the writer; more are dropped
+BATCH_SIZE = 500
+VIEW_LINES = 1000         # lines kept in the Tk view
+VIEW_INTERVAL_MS = 200    # Tk view refresh cap
+MAX_BYTES = 5 * 1024 * 1024
+BACKUPS = 5
 
-def log(msg):
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    full = f"[{timestamp}] {msg}"
-    print(full)
-    if _ui_callback:
-        _ui_callback(full)
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_dropped = 0
+_writer = None
+_start_lock = threading.Lock()
+
+_file = None              # RotatingFile for the text log
+_json = None              # RotatingFile for JSON lines, if enabled
+_view_lines = deque(maxlen=VIEW_LINES)   # lines not yet shown in the Tk view
+_view_lock = threading.Lock()
+
+
+class RotatingFile:
+    """Append-only text file rotated to <path>.1 .. <path>.<backups> at `max_bytes`."""
+
+    def __init__(self, path, max_bytes=MAX_BYTES, backups=BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._f = None
+
+    def write(self, text):
+        if self._f is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._f = open(self.path, "a", encoding="utf-8")
+        self._f.write(text)
+        self._f.flush()
+        if self._f.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self._f.close()
+        self._f = None
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+def configure(log_file=LOG_FILE, max_bytes=MAX_BYTES, backups=BACKUPS, json_lines=False):
+    """
+    Set up the file sinks (call once at startup). `log_file` None disables
+    the text log; `json_lines` also writes <log_file>.jsonl, or that path
+    if a string is given.
+    """
+    global _file, _json
+    flush()
+    for sink in (_file, _json):
+        if sink:
+            sink.close()
+    _file = RotatingFile(log_file, max_bytes, backups) if log_file else None
+    if json_lines:
+        path = json_lines if isinstance(json_lines, str) else f"{log_file or LOG_FILE}.jsonl"
+        _json = RotatingFile(path, max_bytes, backups)
+    else:
+        _json = None
+
+
+def log(msg, **fields):
+    """
+    Queue a log line; never blocks. Extra keyword `fields` only go to the
+    JSON-lines sink, e.g. log("Payment CONFIRMED", phone=phone).
+    """
+    global _dropped
+    _ensure_writer()
+    try:
+        _queue.put_nowait((time.time(), threading.current_thread().name, str(msg), fields))
+    except queue.Full:
+        _dropped += 1
+
+
+def _ensure_writer():
+    global _writer
+    if _writer is None:
+        with _start_lock:
+            if _writer is None:
+                _writer = threading.Thread(target=_write_loop, name="log-writer", daemon=True)
+                _writer.start()
+
+
+def _write_loop():
+    global _dropped
+    while True:
+        batch = [_queue.get()]
+        while len(batch) < BATCH_SIZE:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        taken = len(batch)
+        if _dropped:
+            dropped, _dropped = _dropped, 0
+            batch.append((time.time(), "log-writer", f"[LOG] {dropped} messages dropped (queue full)", {}))
+        try:
+            _write(batch)
+        except Exception as e:
+            sys.stderr.write(f"[LOG] write failed: {e}\n")
+        finally:
+            for _ in range(taken):
+                _queue.task_done()
+
+
+def _write(batch):
+    lines = []
+    for ts, _, msg, _ in batch:
+        stamp = datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+        lines.append(f"[{stamp}] {msg}")
+    text = "\n".join(lines) + "\n"
+
+    if sys.stdout:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+    if _file:
+        _file.write(text)
+    if _json:
+        _json.write("".join(
+            json.dumps(dict(fields, ts=round(ts, 3), thread=thread, msg=msg), default=str) + "\n"
+            for ts, thread, msg, fields in batch
+        ))
+    with _view_lock:
+        _view_lines.extend(lines)
+
+
+def flush(timeout=2.0):
+    """Wait (up to `timeout`) until everything logged so far is written."""
+    if _writer is None:
+        return
+    deadline = time.time() + timeout
+    while _queue.unfinished_tasks and time.time() < deadline:
+        time.sleep(0.01)
+
+
+atexit.register(flush)
+
+
+#Tk view
+def attach_view(root, widget, max_lines=VIEW_LINES, interval_ms=VIEW_INTERVAL_MS):
+    """
+    Show the log in a Text/ScrolledText widget (call from the Tk thread).
+    New lines are added in one insert per refresh and the widget is
+    trimmed to the last `max_lines` lines.
+    """
+    global _view_lines
+    with _view_lock:
+        _view_lines = deque(_view_lines, maxlen=max_lines)
+
+    def refresh():
+        with _view_lock:
+            lines = list(_view_lines)
+            _view_lines.clear()
+        if lines:
+            widget.config(state="normal")
+            widget.insert("end", "\n".join(lines) + "\n")
+            excess = int(widget.index("end-1c").split(".")[0]) - 1 - max_lines
+            if excess > 0:
+                widget.delete("1.0", f"{excess + 1}.0")
+            widget.see("end")
+            widget.config(state="disabled")
+        root.after(interval_ms, refresh)
+
+    root.after(interval_ms, refresh)
@@ -1,16 +1,20 @@
 
 import os
+import sys
+import json
 import threading
+import time
 import tkinter as tk
 from tkinter import simpledialog, messagebox, scrolledtext
-import csv
 import random
 import string
-import subprocess
 
 from settings import (
     load_settings,
     save_settings,
+    settings_damaged,
+    clear_damaged,
+    subscribe,
     settings,
     hash_password,
     is_locked,
@@ -18,24 +22,25 @@ from settings import (
     reset_failed_attempts
 )
 
-from logger import log, set_ui_callback
+import logger
+from logger import log
 from music import search_music
-from session import start_session
-from email_service import send_recovery_email, send_session_email
-from mpesa import initiate_mpesa_payment, is_valid_phone
 from motor import init_serial
-from webcam import open_camera_preview
+from transcode import start_workers as start_transcode_workers
 
-#FIXED IMPORTS
-from share import (
-    share_via_whatsapp,
-    login_whatsapp,
-    get_last_video
-)
+# session/webcam/camera (cv2), mpesa (requests), share (selenium) and
+# email_service are imported where they are first used, and preloaded by
+# warm_up() once the window is on screen. bench_startup.py checks that
+# none of them load before the first paint.
+
+POSTER_SIZE = (320, 180)   # share confirmation / admin thumbnails
 
 #INITIALIZATION
 load_settings()
-init_serial()
+logger.configure(
+    max_bytes=int(settings.get("log_max_mb", 5) * 1024 * 1024),
+    json_lines=settings.get("log_json", False)
+)
 
 root = tk.Tk()
 root.title("360 Booth System")
@@ -50,22 +55,31 @@ countdown_label = tk.Label(root, text="Waiting...", font=("Arial", 14))
 countdown_label.pack(pady=5)
 
 #LOGGER
-def ui_log(msg):
-    log_text.config(state="normal")
-    log_text.insert(tk.END, msg + "\n")
-    log_text.see(tk.END)
-    log_text.config(state="disabled")
+# Fed from the Tk thread in batches; log() itself is safe from any thread
+logger.attach_view(root, log_text, max_lines=int(settings.get("log_view_lines", 1000)))
 
-set_ui_callback(ui_log)
+subscribe(("price", "record_time", "video_backend"),
+          lambda key, value, old: log(f"[SETTINGS] {key}: {old} -> {value}"))
 
 #ADMIN FUNCTIONS
 def admin_login():
     if settings.get("password") is None:
+        if settings_damaged():
+            # Don't let a damaged file quietly turn into "no password set"
+            if not messagebox.askyesno(
+                "Settings Damaged",
+                "settings.json could not be read (kept as settings.json.corrupt),\n"
+                "so all settings are back to defaults.\n\n"
+                "Restore that file and restart, or continue with defaults\n"
+                "and set a new admin password now?"
+            ):
+                return
+            clear_damaged()
         pw = simpledialog.askstring("Set Admin Password", "Create password:", show="*")
         if not pw:
             return
         settings["password"] = hash_password(pw)
-        save_settings()
+        save_settings(now=True)
         messagebox.showinfo("Saved", "Admin password set")
         return
 
@@ -98,7 +112,7 @@ def change_password():
         return
 
     settings["password"] = hash_password(new)
-    save_settings()
+    save_settings(now=True)
     messagebox.showinfo("Success", "Password changed")
 
 def recover_password():
@@ -111,8 +125,9 @@ def recover_password():
     settings["password"] = hash_password(temp_pw)
     settings["lock_until"] = 0
     reset_failed_attempts()
-    save_settings()
+    save_settings(now=True)
 
+    from email_service import send_recovery_email
     if send_recovery_email(email, temp_pw):
         messagebox.showinfo("Success", "Temporary password sent to admin email")
     else:
@@ -143,6 +158,10 @@ def open_settings():
     e_email.insert(0, settings.get("email", ""))
     e_email.grid(row=3, column=1)
 
+    tk.Label(win, text="Video Backend").grid(row=4, column=0)
+    backend_var = tk.StringVar(value=settings.get("video_backend", "opencv"))
+    tk.OptionMenu(win, backend_var, "opencv", "ffmpeg").grid(row=4, column=1)
+
     def save_and_close():
         try:
             settings["price"] = float(e_price.get())
@@ -157,39 +176,81 @@ def open_settings():
             settings["record_time"] = 10
 
         settings["email"] = e_email.get()
+        settings["video_backend"] = backend_var.get()
         save_settings()
         log("Settings updated")
         win.destroy()
 
     tk.Button(win, text="Save", command=save_and_close)\
-        .grid(row=4, column=0, columnspan=2, pady=5)
+        .grid(row=5, column=0, columnspan=2, pady=5)
 
     def login_whatsapp_button():
+        from share import login_whatsapp
         threading.Thread(target=login_whatsapp, daemon=True).start()
         messagebox.showinfo("WhatsApp", "WhatsApp Web opened.\nScan QR code if required.")
 
     tk.Button(win, text="Login WhatsApp", command=login_whatsapp_button)\
-        .grid(row=5, column=0, columnspan=2, pady=5)
+        .grid(row=6, column=0, columnspan=2, pady=5)
+
+    tk.Button(win, text="Analytics", command=open_analytics)\
+        .grid(row=7, column=0, columnspan=2, pady=5)
+
+    import catalog
+    from player import poster_image
+    last = catalog.latest() or {}
+    poster = poster_image(last.get("poster_path"), POSTER_SIZE)
+    if poster is not None:
+        tk.Label(win, text="Last session").grid(row=8, column=0, columnspan=2)
+        thumb = tk.Label(win, image=poster)
+        thumb.image = poster   # keep a reference for Tk
+        thumb.grid(row=9, column=0, columnspan=2, pady=5)
+
+ANALYTICS_PERIODS = {"Today": 1, "Last 7 days": 7, "Last 30 days": 30, "Season": None}
+
+def open_analytics():
+    """Revenue/utilization report from the ledger rollups (admin window)."""
+    from analytics import period, report, format_report
 
-# ======== SESSION CSV ========
-if not os.path.exists("sessions.csv"):
-    with open("sessions.csv", "w", newline="") as f:
-        csv.writer(f).writerow(["timestamp", "phone_number", "duration", "price"])
+    win = tk.Toplevel(root)
+    win.title("Analytics")
+    choice = tk.StringVar(value="Last 7 days")
+    text = tk.Text(win, width=64, height=20, font=("Courier", 10), state="disabled")
+
+    def refresh(*_):
+        days = ANALYTICS_PERIODS[choice.get()]
+        first, last = period(days) if days else (None, None)
+        body = format_report(report(first, last), first, last, per_day=days is not None and days > 1)
+        text.config(state="normal")
+        text.delete("1.0", tk.END)
+        text.insert(tk.END, body)
+        text.config(state="disabled")
+
+    tk.OptionMenu(win, choice, *ANALYTICS_PERIODS, command=refresh).pack(pady=5)
+    text.pack(padx=10, pady=5)
+    tk.Button(win, text="Refresh", command=refresh).pack(pady=5)
+    refresh()
 
 def replay_last_video():
-    video = get_last_video()
-    if not video:
-        log("No recorded video to replay")
-        return
-    subprocess.run(["xdg-open", video])
+    # In-app, frame-paced player (replay.py); runs on a worker thread
+    # because it may wait for the video's transcode first
+    from replay import replay_last_video as replay_in_app
+    replay_in_app(root)
+
+def open_attract_screen():
+    from replay import start_attract
+    start_attract(root)
 
 #SESSION FLOW
 def on_session_complete(phone, amount):
     log(f"Session completed for {phone}, amount {amount}")
+    from email_service import send_session_email
     if not send_session_email(phone, amount):
         log("[EMAIL] Failed to send session notification")
 
 def start_flow():
+    from mpesa import initiate_mpesa_payment, is_valid_phone
+    from session import start_session
+
     phone = simpledialog.askstring("Payment", "Enter phone (07... or 01...):")
     if not phone:
         return
@@ -211,12 +272,15 @@ def start_flow():
 
     def pay():
         try:
-            if initiate_mpesa_payment(phone, amount):
+            checkout_id = initiate_mpesa_payment(phone, amount)
+            if checkout_id:
                 start_session(
                     root,
                     countdown_label,
                     phone,
-                    on_complete=lambda: on_session_complete(phone, amount)
+                    on_complete=lambda: on_session_complete(phone, amount),
+                    checkout_id=checkout_id,
+                    paid_at=time.time()
                 )
             else:
                 messagebox.showerror("Payment Failed", "Payment not confirmed")
@@ -238,8 +302,32 @@ def share_last_session():
     if client_phone.startswith(("07", "01")):
         client_phone = "254" + client_phone[1:]
 
-    #NO DOUBLE THREADING
-    share_via_whatsapp(client_phone)
+    confirm_share(client_phone)
+
+def confirm_share(client_phone):
+    """Show the poster of the video about to be sent, then send on confirm."""
+    import catalog
+    from player import poster_image
+
+    video = catalog.latest() or {}
+    win = tk.Toplevel(root)
+    win.title("Send this video?")
+    poster = poster_image(video.get("poster_path"), POSTER_SIZE)
+    if poster is not None:
+        tk.Label(win, image=poster).pack(padx=10, pady=10)
+        win.poster = poster   # keep a reference for Tk
+    tk.Label(win, text=f"Send to {client_phone}").pack(pady=5)
+
+    def send():
+        win.destroy()
+        #NO DOUBLE THREADING
+        from share import share_via_whatsapp
+        share_via_whatsapp(client_phone)
+
+    buttons = tk.Frame(win)
+    buttons.pack(pady=5)
+    tk.Button(buttons, text="Send", command=send).pack(side="left", padx=5)
+    tk.Button(buttons, text="Cancel", command=win.destroy).pack(side="left", padx=5)
 
 #MENU BAR 
 menubar = tk.Menu(root)
@@ -261,8 +349,12 @@ tk.Button(frame, text="Music", command=search_music)\
 tk.Button(frame, text="Start", command=start_flow)\
     .grid(row=0, column=1, padx=5)
 
+def open_preview():
+    from webcam import open_camera_preview
+    open_camera_preview()
+
 tk.Button(frame, text="Camera", command=lambda:
-    threading.Thread(target=open_camera_preview, daemon=True).start()
+    threading.Thread(target=open_preview, daemon=True).start()
 ).grid(row=0, column=2, padx=5)
 
 tk.Button(frame, text="Replay", command=lambda:
@@ -272,6 +364,34 @@ tk.Button(frame, text="Replay", command=lambda:
 tk.Button(frame, text="Share", command=share_last_session)\
     .grid(row=0, column=4, padx=5)
 
+tk.Button(frame, text="Attract", command=open_attract_screen)\
+    .grid(row=0, column=5, padx=5)
+
+#BACKGROUND WARM-UP
+def warm_up():
+    """Hardware, workers and heavy imports, after the window is up."""
+    init_serial()
+    start_transcode_workers()
+    import mpesa, email_service, session, webcam, replay  # noqa: F401
+    import ledger
+    ledger.open_ledger()   # one-time sessions.csv import happens here, not mid-session
+    from camera import warm_up as warm_up_camera
+    from music import init_mixer
+    init_mixer()
+    log("Warm-up done")
+    warm_up_camera()
+
+def report_first_paint():
+    """Startup probe for bench_startup.py: report loaded modules and exit."""
+    root.update()
+    loaded = sorted({name.split(".")[0] for name in sys.modules})
+    print("FIRST_PAINT " + json.dumps(loaded), flush=True)
+    os._exit(0)
+
 #START
 log("System ready")
+if os.environ.get("BOOTH_STARTUP_PROBE"):
+    root.after(0, report_first_paint)
+else:
+    root.after(0, lambda: threading.Thread(target=warm_up, daemon=True).start())
 root.mainloop()
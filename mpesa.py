@@ -98,6 +98,7 @@ def query_payment_status(checkout_id):
 
 
 def initiate_mpesa_payment(phone, amount):
+    """STK push and wait for confirmation. Returns the CheckoutRequestID when paid, else False."""
     token = get_access_token()
     if not token:
         log("[MPESA ERROR] No access token")
@@ -142,7 +143,7 @@ def initiate_mpesa_payment(phone, amount):
             time.sleep(1)
             if query_payment_status(checkout_id):
                 log("Payment CONFIRMED")
-                return True
+                return checkout_id
 
         log("[MPESA ERROR] Payment not confirmed (timeout)")
         return False
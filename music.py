@@ -2,12 +2,16 @@
 import os
 import shutil
 import subprocess
-import yt_dlp
-import pygame
+import threading
+import time
 import tkinter as tk
 from tkinter import simpledialog, messagebox
 
-pygame.mixer.init()
+# yt_dlp and pygame are imported on first use (or by main's background
+# warm-up) so they don't delay the first window at startup.
+_pygame = None
+_mixer_lock = threading.Lock()
+_selected_title = None
 
 #File paths
 PREVIEW_FILE = "preview_temp.mp3"
@@ -26,8 +30,20 @@ def log(msg):
         log_callback(msg)
     print(msg)
 
+def init_mixer():
+    """Import pygame and start the mixer, once. Returns the pygame module."""
+    global _pygame
+    with _mixer_lock:
+        if _pygame is None:
+            import pygame
+            pygame.mixer.init()
+            _pygame = pygame
+    return _pygame
+
 #YouTube search
 def search_youtube(query, max_results=5):
+    import yt_dlp
+
     ydl_opts = {
         'quiet': True,
         'skip_download': True,
@@ -45,6 +61,7 @@ def search_youtube(query, max_results=5):
 #Preview song
 def preview_song(video_url):
     try:
+        import yt_dlp
         log("Previewing song...")
 
         preview_file = "preview_temp.mp3"
@@ -83,13 +100,15 @@ def preview_song(video_url):
     except Exception as e:
         log(f"Preview error: {e}")
 #Select song
-def select_song(youtube_url):
+def select_song(youtube_url, title=None):
+    global _selected_title
     if os.path.exists(PREVIEW_FILE):
         shutil.copy(PREVIEW_FILE, SELECTED_FILE)
         try: os.remove(PREVIEW_FILE)
         except: pass
         log("Song selected from preview!")
     else:
+        import yt_dlp
         ydl_opts = {
             "format": "bestaudio/best",
             "outtmpl": SELECTED_FILE,
@@ -104,6 +123,12 @@ def select_song(youtube_url):
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             ydl.download([youtube_url])
         log("Song downloaded directly as selection.")
+    _selected_title = title
+
+
+def selected_song_title():
+    """Title of the selected song (for the session ledger), if known."""
+    return _selected_title
 
 #Tkinter music search
 def search_music():
@@ -123,18 +148,24 @@ def search_music():
             link = v['url']
             tk.Label(win, text=title, wraplength=500, justify='left').grid(row=i, column=0, sticky='w')
             tk.Button(win, text="Preview", command=lambda u=link: preview_song(u)).grid(row=i, column=1)
-            tk.Button(win, text="Select", command=lambda u=link: select_song(u)).grid(row=i, column=2)
+            tk.Button(win, text="Select", command=lambda u=link, t=title: select_song(u, t)).grid(row=i, column=2)
     except Exception as e:
         messagebox.showerror("Search Error", str(e))
 
 #Play/Stop selected song
 def play_selected_song():
+    """Play the selected song; returns the time playback started, or None."""
     if os.path.exists(SELECTED_FILE):
-        pygame.mixer.music.load(SELECTED_FILE)
-        pygame.mixer.music.play()
+        music = init_mixer().mixer.music
+        music.load(SELECTED_FILE)
+        music.play()
+        started = time.time()
         log("Playing selected song...")
+        return started
     else:
         log("[ERR] No selected song available!")
+        return None
 
 def stop_music():
-    pygame.mixer.music.stop()
+    if _pygame is not None:
+        _pygame.mixer.music.stop()
@@ -0,0 +1,257 @@
+# pipeline.py
+# Capture -> process -> write pipeline used by the recording loops.
+# Each stage runs on its own thread and the stages are joined by bounded
+# queues, so a slow detector or a slow disk never stalls cap.read().
+import queue
+import threading
+import time
+
+from logger import log
+
+# Drop policies for a full queue
+DROP_OLDEST = "drop_oldest"   # discard the oldest queued frame, keep the new one
+DROP_NEWEST = "drop_newest"   # discard the new frame
+BLOCK = "block"               # wait for the consumer (never drops)
+DROP_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+_STOP = object()
+
+
+class StageQueue:
+    """Bounded queue between two stages that keeps depth counters."""
+
+    def __init__(self, name, maxsize=8, policy=DROP_OLDEST):
+        if policy not in DROP_POLICIES:
+            log(f"[PIPELINE] Unknown drop policy '{policy}', using {DROP_OLDEST}")
+            policy = DROP_OLDEST
+        self.name = name
+        self.policy = policy
+        self.maxsize = maxsize
+        self._q = queue.Queue(maxsize=maxsize)
+        self.put_count = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self._depth_sum = 0
+
+    def put(self, item):
+        """Queue an item, applying the drop policy. Returns False if dropped."""
+        accepted = True
+        if self.policy == BLOCK:
+            self._q.put(item)
+        else:
+            try:
+                self._q.put_nowait(item)
+            except queue.Full:
+                self.dropped += 1
+                if self.policy == DROP_NEWEST:
+                    accepted = False
+                else:
+                    try:
+                        self._q.get_nowait()
+                    except queue.Empty:
+                        pass
+                    self._q.put(item)
+
+        depth = self._q.qsize()
+        self.put_count += 1
+        self._depth_sum += depth
+        self.max_depth = max(self.max_depth, depth)
+        return accepted
+
+    def get(self, timeout=None):
+        """Next item; raises queue.Empty if `timeout` expires."""
+        return self._q.get(timeout=timeout)
+
+    def qsize(self):
+        return self._q.qsize()
+
+    def close(self):
+        """Tell the consumer no more items are coming (never dropped)."""
+        self._q.put(_STOP)
+
+    def stats(self):
+        return {
+            "maxsize": self.maxsize,
+            "policy": self.policy,
+            "put": self.put_count,
+            "dropped": self.dropped,
+            "max_depth": self.max_depth,
+            "avg_depth": round(self._depth_sum / self.put_count, 2) if self.put_count else 0.0,
+        }
+
+
+class RecordingPipeline:
+    """
+    Runs capture, processing and writing on three threads.
+
+    read()          -> (ok, frame) or (ok, frame, ts), called on the capture thread
+    process(frame)  -> frame, called on the processing thread
+    write(ts, frame)   called on the writer thread
+    on_frame(elapsed)  optional, called on the capture thread per frame
+
+    Items travel through the queues as (timestamp, frame) so later stages
+    know when each frame was actually captured.
+
+    With process_workers > 1, process() runs on that many threads (it must
+    be thread-safe). Each frame gets a sequence number as it leaves the
+    process queue and results are put back in that order before they reach
+    the writer.
+    """
+
+    def __init__(self, read, process, write, duration,
+                 queue_size=8, drop_policy=DROP_OLDEST, on_frame=None,
+                 process_workers=1):
+        self.read = read
+        self.process = process
+        self.write = write
+        self.duration = duration
+        self.on_frame = on_frame
+        self.process_workers = max(1, int(process_workers))
+
+        self.process_q = StageQueue("process", queue_size, drop_policy)
+        self.write_q = StageQueue("write", queue_size, drop_policy)
+
+        self.counts = {"captured": 0, "processed": 0, "written": 0}
+        self.errors = []
+        self.started_at = None
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+
+        # Sequence numbering and reordering for parallel processing
+        self._take_lock = threading.Lock()
+        self._order_lock = threading.Lock()
+        self._next_seq = 0
+        self._next_out = 0
+        self._done = {}
+        self._workers_left = self.process_workers
+        self.reorder_max = 0
+
+    def saturated(self):
+        """True when the process queue is at least half full."""
+        return self.process_q.qsize() * 2 >= self.process_q.maxsize
+
+    def stop(self):
+        """Ask the capture stage to finish early."""
+        self._stop.set()
+
+    #Stages
+    def _capture(self):
+        try:
+            while not self._stop.is_set():
+                now = time.time()
+                if now - self.started_at >= self.duration:
+                    break
+                result = self.read()
+                ret, frame = result[0], result[1]
+                if not ret:
+                    log("[PIPELINE] Camera read failed, stopping capture")
+                    break
+                # Prefer the source's own capture time when it provides one
+                ts = result[2] if len(result) > 2 else time.time()
+                self.counts["captured"] += 1
+                self.process_q.put((ts, frame))
+                if self.on_frame:
+                    self.on_frame(ts - self.started_at)
+        except Exception as e:
+            self.errors.append(f"capture: {e}")
+            log(f"[PIPELINE] Capture error: {e}")
+        finally:
+            self.elapsed = time.time() - self.started_at
+            self.process_q.close()
+
+    def _process(self):
+        try:
+            while True:
+                with self._take_lock:
+                    item = self.process_q.get()
+                    if item is _STOP:
+                        # Pass the stop on to the next worker
+                        self.process_q.close()
+                        break
+                    seq = self._next_seq
+                    self._next_seq += 1
+                ts, frame = item
+                try:
+                    frame = self.process(frame)
+                except Exception as e:
+                    self.errors.append(f"process: {e}")
+                    log(f"[PIPELINE] Processing error: {e}")
+                self._release(seq, (ts, frame))
+        finally:
+            with self._order_lock:
+                self._workers_left -= 1
+                last = self._workers_left == 0
+            if last:
+                self.write_q.close()
+
+    def _release(self, seq, item):
+        """Hand results to the writer in sequence order."""
+        with self._order_lock:
+            self.counts["processed"] += 1
+            self._done[seq] = item
+            self.reorder_max = max(self.reorder_max, len(self._done))
+            while self._next_out in self._done:
+                self.write_q.put(self._done.pop(self._next_out))
+                self._next_out += 1
+
+    def _writer(self):
+        while True:
+            item = self.write_q.get()
+            if item is _STOP:
+                break
+            ts, frame = item
+            try:
+                self.write(ts, frame)
+                self.counts["written"] += 1
+            except Exception as e:
+                self.errors.append(f"write: {e}")
+                log(f"[PIPELINE] Write error: {e}")
+
+    def run(self, start_ts=None):
+        """
+        Run the pipeline to completion and return its stats. `start_ts`
+        (default: now) is the time base for `duration`, e.g. the end of the
+        countdown when the source replays buffered frames.
+        """
+        self.started_at = start_ts or time.time()
+        threads = [
+            threading.Thread(target=self._capture, name="pipeline-capture", daemon=True),
+            threading.Thread(target=self._writer, name="pipeline-writer", daemon=True),
+        ] + [
+            threading.Thread(target=self._process, name=f"pipeline-process-{i}", daemon=True)
+            for i in range(self.process_workers)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return self.stats()
+
+    def stats(self):
+        elapsed = self.elapsed or 0.0
+        return {
+            "elapsed": round(elapsed, 2),
+            "capture_fps": round(self.counts["captured"] / elapsed, 2) if elapsed else 0.0,
+            "counts": dict(self.counts),
+            "process_workers": self.process_workers,
+            "reorder_max": self.reorder_max,
+            "queues": {
+                self.process_q.name: self.process_q.stats(),
+                self.write_q.name: self.write_q.stats(),
+            },
+            "errors": list(self.errors),
+        }
+
+
+def format_stats(stats):
+    """One-line summary of pipeline stats for the log."""
+    c = stats["counts"]
+    parts = [
+        f"{stats['elapsed']}s @ {stats['capture_fps']} fps",
+        f"captured={c['captured']} processed={c['processed']} written={c['written']}",
+    ]
+    if stats.get("process_workers", 1) > 1:
+        parts.append(f"workers={stats['process_workers']} reorder max={stats['reorder_max']}")
+    for name, q in stats["queues"].items():
+        parts.append(f"{name}: max={q['max_depth']}/{q['maxsize']} avg={q['avg_depth']} dropped={q['dropped']}")
+    return " | ".join(parts)
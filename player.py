@@ -0,0 +1,215 @@
+# player.py
+# In-app video player for replays and the attract screen.
+#
+# A decode-ahead thread reads, scales and colour-converts frames into a
+# bounded queue. The Tk thread presents them against a clock started at the
+# first frame, using the container's timestamps (CAP_PROP_POS_MSEC), so the
+# clip plays in real time whatever the decode cost per frame. Frames whose
+# time has already passed are dropped instead of slowing playback down.
+import queue
+import threading
+import time
+
+import cv2
+from PIL import Image, ImageTk
+
+from logger import log
+
+DEFAULT_QUEUE_SIZE = 8
+DEFAULT_FPS = 30.0
+MAX_TICK_MS = 50      # re-check the queue at least this often while waiting
+
+_END = object()
+
+
+def poster_image(path, size):
+    """PhotoImage of a poster JPEG scaled to fit `size` (w, h), or None."""
+    if not path:
+        return None
+    try:
+        image = Image.open(path)
+        image.thumbnail(size)
+        return ImageTk.PhotoImage(image)
+    except OSError:
+        return None
+
+
+class ReplayPlayer:
+    """
+    Plays a video file into a Tk widget (a Label) at its recorded pace.
+
+    play(path, loop=False, on_done=None) starts playback; stop() ends it.
+    With `loop` the clip repeats seamlessly: the decode thread rewinds and
+    keeps the timestamps increasing, so pacing carries on across the seam.
+    Must be created and driven from the Tk thread.
+    """
+
+    def __init__(self, root, widget, size=None, queue_size=DEFAULT_QUEUE_SIZE):
+        self.root = root
+        self.widget = widget
+        self.size = size              # (w, h) to fit into, default the widget's size
+        self.queue_size = queue_size
+        self.path = None
+
+        self._frames = None
+        self._decoder = None
+        self._running = threading.Event()
+        self._photo = None
+        self._pending = None
+        self._clock = None
+        self._after = None
+        self._on_done = None
+
+        self.shown = 0
+        self.dropped = 0
+
+    #Control
+    def play(self, path, loop=False, on_done=None):
+        self.stop()
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            log(f"Cannot open video for replay: {path}")
+            return False
+
+        self.path = path
+        self._on_done = on_done
+        self._frames = queue.Queue(maxsize=self.queue_size)
+        self._pending = None
+        self._clock = None
+        self.shown = self.dropped = 0
+        # A fresh flag per playback, so a previous decoder can't be revived
+        self._running = threading.Event()
+        self._running.set()
+        self._decoder = threading.Thread(
+            target=self._decode, args=(cap, self._frames, self._running, self._target_size(cap), loop),
+            name="replay-decode", daemon=True
+        )
+        self._decoder.start()
+        self._after = self.root.after(1, self._tick)
+        return True
+
+    def stop(self):
+        """Stop playback (on_done is not called)."""
+        self._running.clear()
+        if self._after is not None:
+            self.root.after_cancel(self._after)
+            self._after = None
+        self._on_done = None
+
+    def is_playing(self):
+        return self._running.is_set()
+
+    def show_poster(self, path):
+        """Put a still (e.g. the session poster) up until the first frame is due."""
+        photo = poster_image(path, self.size or (self.widget.winfo_width(), self.widget.winfo_height()))
+        if photo is not None:
+            self._photo = photo
+            self.widget.configure(image=photo)
+
+    def _target_size(self, cap):
+        src = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        box = self.size or (self.widget.winfo_width(), self.widget.winfo_height())
+        if min(box) <= 1 or min(src) <= 0:
+            return None
+        scale = min(box[0] / src[0], box[1] / src[1])
+        return (max(1, int(src[0] * scale)), max(1, int(src[1] * scale)))
+
+    #Decode-ahead thread
+    def _decode(self, cap, frames, running, size, loop):
+        fps = cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+        offset = 0.0     # added per loop pass so timestamps keep increasing
+        last_ts = 0.0
+        index = 0
+        try:
+            while running.is_set():
+                ok, frame = cap.read()
+                if not ok:
+                    if loop and index:
+                        offset = last_ts + 1.0 / fps
+                        index = 0
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        continue
+                    break
+                pos = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                ts = offset + (pos if pos > 0 or index == 0 else index / fps)
+                index += 1
+                last_ts = ts
+
+                if size and (frame.shape[1], frame.shape[0]) != size:
+                    frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                while running.is_set():
+                    try:
+                        frames.put((ts, rgb), timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+        finally:
+            cap.release()
+            try:
+                frames.put(_END, timeout=1.0)
+            except queue.Full:
+                pass
+
+    #Presentation (Tk thread)
+    def _next(self):
+        if self._pending is not None:
+            item, self._pending = self._pending, None
+            return item
+        try:
+            return self._frames.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _tick(self):
+        self._after = None
+        if not self._running.is_set():
+            return
+
+        now = time.perf_counter()
+        due = None
+        while True:
+            item = self._next()
+            if item is None:
+                break
+            if item is _END:
+                self._finish(due)
+                return
+            ts, rgb = item
+            if self._clock is None:
+                self._clock = now - ts       # first frame sets the clock
+            if self._clock + ts > now:
+                self._pending = item         # not yet due
+                break
+            if due is not None:
+                self.dropped += 1            # a later frame is also due: skip this one
+            due = item
+
+        if due is not None:
+            self._show(due[1])
+
+        if self._pending is not None:
+            wait_ms = int((self._clock + self._pending[0] - time.perf_counter()) * 1000)
+            delay = min(max(wait_ms, 1), MAX_TICK_MS)
+        else:
+            delay = 5                        # decoder is behind; poll soon
+        self._after = self.root.after(delay, self._tick)
+
+    def _show(self, rgb):
+        image = Image.fromarray(rgb)
+        if self._photo is None or (self._photo.width(), self._photo.height()) != image.size:
+            self._photo = ImageTk.PhotoImage(image)
+            self.widget.configure(image=self._photo)
+        else:
+            self._photo.paste(image)
+        self.shown += 1
+
+    def _finish(self, last):
+        if last is not None:
+            self._show(last[1])
+        self._running.clear()
+        total = self.shown + self.dropped
+        log(f"[REPLAY] {self.shown}/{total} frames shown, {self.dropped} dropped to keep pace")
+        on_done, self._on_done = self._on_done, None
+        if on_done:
+            on_done()
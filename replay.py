@@ -1,42 +1,117 @@
+# replay.py
+# Replay window and attract screen, both driven by player.ReplayPlayer.
 import os
-import cv2
-from webcam import LAST_RECORDED_VIDEO, VIDEO_DIR
+import tkinter as tk
+
 from logger import log
+import transcode
+import catalog
+import webcam
+from player import ReplayPlayer
+
+REPLAY_SIZE = (960, 540)
+ATTRACT_REFRESH_MS = 30000    # how often the attract screen looks for a newer session
+CLOSE_DELAY_MS = 1500         # keep the last frame up briefly after a replay
 
-def replay_last_video():
-    video_path = None
 
-    # Try to get the newest video from VIDEO_DIR
-    if os.path.exists(VIDEO_DIR):
-        videos = [os.path.join(VIDEO_DIR, f) for f in os.listdir(VIDEO_DIR)
-                  if f.lower().endswith(('.mp4', '.avi'))]
-        if videos:
-            # Sort by creation time, newest first
-            videos.sort(key=os.path.getmtime, reverse=True)
-            video_path = videos[0]
+def find_last_video(wait=True):
+    """
+    Newest session video. With `wait`, block until a pending transcode
+    finishes (call from a worker thread); otherwise take what is on disk.
+    """
+    video_path = catalog.latest_path()
 
-    # Fall back to LAST_RECORDED_VIDEO
-    if not video_path and LAST_RECORDED_VIDEO:
-        video_path = LAST_RECORDED_VIDEO
+    # Fall back to the last preview-window recording
+    if not video_path and webcam.LAST_RECORDED_VIDEO:
+        video_path = webcam.LAST_RECORDED_VIDEO
+
+    if video_path and wait:
+        video_path = transcode.resolve(video_path)
 
     if not video_path or not os.path.exists(video_path):
+        return None
+    return video_path
+
+
+def replay_last_video(root):
+    """
+    Replay the newest session in a window. Its proxy clip plays right away;
+    without one, wait for the master's transcode (call from a worker thread).
+    """
+    video = catalog.latest() or {}
+    proxy = video.get("proxy_path")
+    if proxy and os.path.exists(proxy):
+        video_path = proxy
+    else:
+        video_path = find_last_video()
+    if not video_path:
         log("No recorded video available for replay")
         return
+    root.after(0, lambda: open_replay_window(root, video_path, video.get("poster_path")))
+
+
+def open_replay_window(root, video_path, poster_path=None):
+    """Play one video in a Toplevel (Tk thread). Closes itself when done."""
+    win = tk.Toplevel(root)
+    win.title("Replay")
+    win.configure(bg="black")
+    win.geometry(f"{REPLAY_SIZE[0]}x{REPLAY_SIZE[1]}")
+    label = tk.Label(win, bg="black")
+    label.pack(fill="both", expand=True)
+    player = ReplayPlayer(root, label, size=REPLAY_SIZE)
 
+    def close():
+        player.stop()
+        if win.winfo_exists():
+            win.destroy()
+
+    win.protocol("WM_DELETE_WINDOW", close)
+    win.bind("<Escape>", lambda e: close())
+    player.show_poster(poster_path)
     log(f"Replaying video → {video_path}")
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        log("Cannot open video for replay")
-        return
+    if not player.play(video_path, on_done=lambda: win.after(CLOSE_DELAY_MS, close)):
+        close()
+    return player
+
+
+def start_attract(root):
+    """
+    Fullscreen loop of the latest session for the idle booth (Tk thread).
+    Switches to newer sessions as they are recorded; any key or click
+    closes it.
+    """
+    video_path = find_last_video(wait=False)
+    if not video_path:
+        log("No recorded video for the attract screen")
+        return None
+
+    win = tk.Toplevel(root)
+    win.attributes("-fullscreen", True)
+    win.configure(bg="black")
+    label = tk.Label(win, bg="black")
+    label.pack(fill="both", expand=True)
+    size = (win.winfo_screenwidth(), win.winfo_screenheight())
+    player = ReplayPlayer(root, label, size=size)
+    current = [video_path]
+    refresh_id = [None]
+
+    def refresh():
+        newest = find_last_video(wait=False)
+        if newest and newest != current[0]:
+            log(f"[REPLAY] Attract screen now showing {os.path.basename(newest)}")
+            current[0] = newest
+            player.play(newest, loop=True)
+        refresh_id[0] = win.after(ATTRACT_REFRESH_MS, refresh)
+
+    def close(event=None):
+        player.stop()
+        if refresh_id[0] is not None:
+            win.after_cancel(refresh_id[0])
+        win.destroy()
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        cv2.imshow("Replay", frame)
-        if cv2.waitKey(30) & 0xFF == ord("q"):
-            break
-
-    cap.release()
-    cv2.destroyAllWindows()
-    log("Replay finished")
+    win.bind("<Key>", close)
+    win.bind("<Button-1>", close)
+    win.focus_set()
+    player.play(video_path, loop=True)
+    refresh_id[0] = win.after(ATTRACT_REFRESH_MS, refresh)
+    return player
@@ -1,46 +1,73 @@
 # session.py
 import os
 import time
-import csv
 import threading
 import cv2
-import pygame
 import tkinter as tk
 from datetime import datetime
-import subprocess
 
 from settings import settings
+from config import VIDEO_DIR
 from logger import log
 from motor import send_motor_command
-from music import play_selected_song
+from music import play_selected_song, stop_music, selected_song_title, SELECTED_FILE
+from detection import make_scheduler, ParallelDetector, log_stats, DEFAULT_DETECT_SCALE
+from face_detectors import detector_from_settings
+from writer import open_writer, open_passthrough_writer, mjpeg_input_args, ProxyRecorder, log_stats as log_writer_stats
+import transcode
+import catalog
+import ledger
+from framepool import FramePool
+from camera import get_camera
+from pipeline import RecordingPipeline, DROP_OLDEST, format_stats
 
-SESSIONS_CSV = "sessions.csv"
-CASCADE_FILE = "haarcascade_frontalface_default.xml"
 countdown_window = None
 
-face_cascade = cv2.CascadeClassifier(CASCADE_FILE)
-if face_cascade.empty():
-    raise Exception("Haar cascade not found!")
+# Queue/throughput counters of the most recent session (see pipeline.py)
+last_session_stats = None
 
-pygame.mixer.init()
-
-def convert_to_whatsapp_mp4(input_file):
-    """Convert OpenCV mp4 to WhatsApp-compatible mp4 using H264"""
-    output_file = input_file.replace(".mp4", "_wa.mp4")
-    subprocess.run([
-        "ffmpeg", "-y", "-i", input_file,
-        "-c:v", "libx264", "-preset", "fast", "-crf", "23",
-        "-c:a", "aac", "-b:a", "128k",
-        output_file
-    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    return output_file
-
-def start_session(root, countdown_label, phone_number, on_complete=None):
+def start_session(root, countdown_label, phone_number, on_complete=None, checkout_id=None, paid_at=None):
     """
     Starts a 360 booth session with countdown, recording, motor + music control.
-    Calls on_complete() after session finishes if provided.
+    Calls on_complete() after session finishes if provided. The session is
+    entered in the ledger under the payment's `checkout_id` (confirmed at
+    `paid_at`).
     """
     duration = int(settings.get("record_time", 10))
+    countdown = 3
+    preroll = float(settings.get("preroll_seconds", 0))
+    queue_size = int(settings.get("pipeline_queue_size", 8))
+    fps = float(settings.get("record_fps", 30))
+    # Passthrough keeps the camera's own JPEG frames (no decode, no face
+    # crop) and leaves all encoding to the background transcode.
+    passthrough = [settings.get("record_mode", "processed") == "passthrough"]
+
+    # Capture starts with the countdown into a bounded ring of recent frames,
+    # so the recording can begin on the exact frame where the countdown ends.
+    camera_ready = threading.Event()
+    camera_sub = [None]
+
+    def open_camera():
+        # record() waits on camera_ready: set it even if opening raises, so
+        # a missing subscription takes the "not detected" path instead of
+        # hanging the session.
+        try:
+            camera = get_camera()
+            if passthrough[0] and camera.open() and not camera.set_raw(True):
+                log("[CAMERA] Falling back to processed recording")
+                passthrough[0] = False
+            # Older frames fall out of the ring; it only has to cover the
+            # pre-roll plus the delay until the record thread starts reading.
+            # The ring is sized at the camera's own rate if that is higher.
+            seconds = preroll + queue_size / fps + 1
+            camera_sub[0] = camera.subscribe_preroll(
+                seconds, fps, float(settings.get("preroll_max_mb", 256)),
+                decode=not passthrough[0]
+            )
+        except Exception as e:
+            log(f"[CAMERA] Opening the camera failed: {e}")
+        finally:
+            camera_ready.set()
 
     def update_countdown(text):
         root.after(0, lambda: countdown_label.config(text=text))
@@ -85,67 +112,174 @@ def start_session(root, countdown_label, phone_number, on_complete=None):
 
         tick(seconds)
 
-    def record():
-        cap = cv2.VideoCapture(0)
-        if not cap.isOpened():
+    def record(go_ts):
+        global last_session_stats
+
+        camera_ready.wait()
+        cap = camera_sub[0]
+        if cap is None:
             log("❌ Webcam not detected")
+            ledger.record(phone_number, 0, settings.get("price"), selected_song_title(),
+                          checkout_id, status=ledger.FAILED, paid_at=paid_at, started_at=go_ts)
+            update_countdown("Camera not available")
+            if on_complete:
+                on_complete()
             return
 
-        w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+        start_ts = go_ts - preroll
+        kept = cap.start_at(start_ts)
+        log(f"[CAMERA] Starting from buffered frame ({kept} frames since go"
+            f"{f', {preroll:g}s pre-roll' if preroll else ''})")
 
-        os.makedirs("videos", exist_ok=True)
-        path = f"videos/Finetake_Photography_{ts}.mp4"
+        w, h = get_camera().size
+        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
 
-        out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (w, h))
+        os.makedirs(VIDEO_DIR, exist_ok=True)
+        if passthrough[0]:
+            path = os.path.join(VIDEO_DIR, f"Finetake_Photography_{ts}.mjpeg")
+            out, encoded = open_passthrough_writer(path, settings), False
+            codec = "mjpeg"
+        else:
+            path = os.path.join(VIDEO_DIR, f"Finetake_Photography_{ts}.mp4")
+            out, encoded = open_writer(path, (w, h), settings)
+            codec = "h264" if encoded else "mp4v"
+        catalog.add(path, phone_number, created=start_ts, codec=codec)
 
-        send_motor_command("F")
-        play_selected_song()
+        # Proxy clip + poster for replay/share screens, from the same frames
+        proxy = None
+        if settings.get("record_proxy", True):
+            proxy = ProxyRecorder(
+                path, out.fps, settings.get("proxy_height", 360),
+                poster_at=preroll + duration / 2
+            )
 
-        start = time.time()
-        while time.time() - start < duration:
-            ret, frame = cap.read()
-            if not ret:
-                break
+        # With several workers every frame is detected independently on its
+        # own thread; the pipeline restores frame order and the crop is done
+        # on the writer thread.
+        workers = 1 if passthrough[0] else max(1, int(settings.get("detect_workers", 1)))
+        if workers > 1:
+            detector = ParallelDetector(
+                lambda: detector_from_settings(settings),
+                settings.get("detect_scale", DEFAULT_DETECT_SCALE),
+                saturated=lambda: pipeline.saturated()
+            )
+        else:
+            detector = make_scheduler(detector_from_settings(settings), settings)
 
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+        # Crops only cross the write queue (+ the one being written and the
+        # writer's gap-fill frame). Capture frames come from the camera manager.
+        pool = FramePool(depth=queue_size + 3)
 
-            if len(faces):
-                x, y, fw, fh = max(faces, key=lambda f: f[2] * f[3])
+        def crop_to_face(frame, face):
+            if face is not None:
+                x, y, fw, fh = face
                 cx, cy = x + fw // 2, y + fh // 2
                 size = min(w, h) // 2
                 x1, y1 = max(cx - size // 2, 0), max(cy - size // 2, 0)
                 crop = frame[y1:y1+size, x1:x1+size]
-                frame = cv2.resize(crop, (w, h))
+                frame = cv2.resize(crop, (w, h), dst=pool.get("crop", (h, w, 3)))
+            return frame
+
+        def process(frame):
+            if passthrough[0]:
+                return frame
+            if workers > 1:
+                return frame, detector.detect(frame)
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=pool.get("gray", frame.shape[:2], depth=1))
+            return crop_to_face(frame, detector.update(gray))
 
-            out.write(frame)
-            remaining = duration - int(time.time() - start)
-            update_countdown(f"Recording... {remaining}s")
+        def write(frame_ts, frame):
+            if isinstance(frame, tuple):
+                frame = crop_to_face(*frame)
+            out.write(frame_ts, frame)
+            if proxy:
+                proxy.write(frame_ts, frame)
+
+        last_remaining = [None]
+
+        def on_frame(elapsed):
+            # Only touch Tk when the displayed second changes
+            remaining = duration - int(max(elapsed - preroll, 0))
+            if remaining != last_remaining[0]:
+                last_remaining[0] = remaining
+                update_countdown(f"Recording... {remaining}s")
+
+        pipeline = RecordingPipeline(
+            cap.read_timed, process, write, duration + preroll,
+            queue_size=queue_size,
+            drop_policy=settings.get("pipeline_drop_policy", DROP_OLDEST),
+            on_frame=on_frame,
+            process_workers=workers
+        )
+
+        send_motor_command("F")
+        song_start = play_selected_song()
+        if song_start is not None:
+            out.set_audio(os.path.abspath(SELECTED_FILE), song_start, duration)
+
+        last_session_stats = pipeline.run(start_ts)
+        last_session_stats["detection"] = detector.stats()
+        log(f"[PIPELINE] {format_stats(last_session_stats)}")
+        log_stats(detector)
 
         cap.release()
-        out.release()
+        if passthrough[0]:
+            get_camera().set_raw(False)
+        end_ts = pipeline.started_at + pipeline.elapsed
+        out.close(end_ts)
+        proxy_path, poster_path = proxy.close(end_ts) if proxy else (None, None)
+        last_session_stats["writer"] = out.stats()
+        last_session_stats["audio"] = out.audio_track()
+        log_writer_stats(out)
+        failed = out.failed
+        if failed:
+            log(f"❌ Recording failed: the encoder stopped mid-session, {path} is incomplete")
+            status = catalog.BROKEN
+        else:
+            status = catalog.READY if encoded else catalog.ENCODING
+        # Before submitting: a short transcode could otherwise finish first
+        catalog.finish(
+            path, round(out.written / out.fps, 2), status=status,
+            proxy_path=proxy_path, poster_path=poster_path
+        )
         send_motor_command("S")
-        pygame.mixer.music.stop()
+        stop_music()
 
-        update_countdown("Done")
+        update_countdown("Recording failed" if failed else "Done")
 
-        # Convert to WhatsApp-friendly mp4 but do not send automatically
-        wa_video = convert_to_whatsapp_mp4(path)
-        log(f"Session completed → {wa_video}")
+        # Convert to WhatsApp-friendly mp4 in the background; share/replay
+        # wait on the job. The ffmpeg backend already wrote H.264.
+        video_path = path
+        if failed:
+            pass   # nothing worth encoding; the catalog row is BROKEN
+        elif encoded:
+            log(f"Session completed → {path}")
+        elif passthrough[0]:
+            # The frame log is only an intermediate; the mp4 replaces it
+            video_path = os.path.splitext(path)[0] + ".mp4"
+            transcode.submit(
+                path, video_path, audio=out.audio_track(),
+                input_args=mjpeg_input_args(out.fps), remove_input=True
+            )
+            log(f"Session completed → {path} (encoding in background)")
+        else:
+            transcode.submit(path, audio=out.audio_track())
+            log(f"Session completed → {path} (encoding in background)")
 
         # Log session
-        with open(SESSIONS_CSV, "a", newline="") as f:
-            csv.writer(f).writerow([
-                datetime.now().isoformat(),
-                phone_number,
-                duration,
-                settings.get("price")
-            ])
+        ledger.record(
+            phone_number, round(out.written / out.fps, 2), settings.get("price"),
+            selected_song_title(), checkout_id, video_path,
+            status=ledger.FAILED if failed else ledger.COMPLETED,
+            paid_at=paid_at, started_at=go_ts
+        )
 
         # Callback if provided
         if on_complete:
             on_complete()
 
-    fullscreen_countdown(3, lambda: threading.Thread(target=record, daemon=True).start())
+    threading.Thread(target=open_camera, daemon=True).start()
+    fullscreen_countdown(
+        countdown,
+        lambda: threading.Thread(target=record, args=(time.time(),), daemon=True).start()
+    )
@@ -1,48 +1,271 @@
 # settings.py
+# Booth settings: one shared store backed by settings.json, used by main.py
+# and Booth.py alike.
+#
+# `settings` is a single dict-like object for the life of the process;
+# load_settings() refills it in place, so `from settings import settings`
+# sees current values wherever it was imported. Assigning a key notifies the
+# subscribers of that key (subscribe()). save_settings() coalesces bursts of
+# saves into one write SAVE_DELAY later; the file is replaced atomically
+# (temp file, fsync, rename) and the previous version kept as
+# settings.json.bak, which load_settings() falls back to.
+import atexit
 import os
 import json
 import hashlib
+import threading
+import time
+
+from config import SETTINGS_FILE
+from logger import log
+
+BACKUP_FILE = SETTINGS_FILE + ".bak"
+SAVE_DELAY = 0.5     # seconds; saves requested meanwhile are written together
+
+DEFAULTS = {
+    "price": 0,
+    "till_number": "",
+    "record_time": 10,
+    "email": "",
+    "camera_type": "webcam",
+    "password": None,
+    "lock_until": 0,
+    "failed_attempts": 0,
+    "admin_whatsapp": "",
+    "whatsapp_logged_in": False,  # <=== Persist WhatsApp login
+    "pipeline_queue_size": 8,
+    "pipeline_drop_policy": "drop_oldest",  # drop_oldest | drop_newest | block
+    "detect_every_n": 5,            # run the face cascade every N frames
+    "track_min_confidence": 0.6,    # re-detect when tracking drops below this
+    "detect_mode": "roi",           # roi (downscaled + region) | full
+    "detect_scale": 0.5,
+    "detect_roi_margin": 1.0,
+    "full_scan_every": 10,
+    "record_fps": 30,               # output rate; frames are duplicated/dropped to match
+    "video_backend": "opencv",      # opencv (mp4v + re-encode) | ffmpeg (live H.264)
+    "ffmpeg_preset": "veryfast",
+    "ffmpeg_crf": 23,
+    "transcode_workers": 1,         # background ffmpeg jobs run in parallel
+    "exposure_rate_hz": 2.0,        # camera exposure adjustments per second
+    "camera_keep_warm": True,       # keep the camera open between sessions
+    "preroll_seconds": 0,           # include this much video from before "go"
+    "preroll_max_mb": 256,          # memory cap for the countdown frame buffer
+    "record_mode": "processed",     # processed | passthrough (store camera MJPEG, encode later)
+    "capture_process": False,       # capture in a child process via a shared memory ring
+    "capture_ring_slots": 8,        # frames in that ring
+    "detect_workers": 1,            # >1: detect every frame on that many threads
+    "face_detector": "haar",        # haar | lbp | yunet (see face_detectors.py)
+    "face_model": "",               # model file for that backend; empty = default name in BASE_DIR
+    "record_proxy": True,           # write a low-res proxy clip + poster JPEG per session
+    "proxy_height": 360,
+    "log_view_lines": 1000,         # lines kept in the on-screen log
+    "log_max_mb": 5,                # logs/booth.log rotates at this size
+    "log_json": False               # also write logs/booth.log.jsonl
+}
+
+
+class SettingsStore(dict):
+    """dict that reports changed keys to subscribers."""
+
+    def __init__(self):
+        super().__init__()
+        self._subscribers = {}
+        self._sub_lock = threading.Lock()
+
+    def __setitem__(self, key, value):
+        old = self.get(key)
+        changed = key not in self or old != value
+        super().__setitem__(key, value)
+        if changed:
+            self._notify(key, value, old)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def subscribe(self, keys, callback):
+        """
+        Call callback(key, value, old) whenever one of `keys` (a name or a
+        list of names) changes. It runs on the thread making the change.
+        """
+        for key in ([keys] if isinstance(keys, str) else keys):
+            with self._sub_lock:
+                self._subscribers.setdefault(key, []).append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._sub_lock:
+            for callbacks in self._subscribers.values():
+                if callback in callbacks:
+                    callbacks.remove(callback)
+
+    def _notify(self, key, value, old):
+        with self._sub_lock:
+            callbacks = list(self._subscribers.get(key, ()))
+        for callback in callbacks:
+            try:
+                callback(key, value, old)
+            except Exception as e:
+                log(f"[SETTINGS] Subscriber for '{key}' failed: {e}")
+
+    def _replace(self, values):
+        """Swap in a freshly loaded dict, notifying keys whose value changed."""
+        old = dict(self)
+        super().clear()
+        super().update(values)
+        for key, value in values.items():
+            if key in old and old[key] != value:
+                self._notify(key, value, old[key])
+
+
+settings = SettingsStore()
+subscribe = settings.subscribe
+unsubscribe = settings.unsubscribe
+
+DAMAGED_KEY = "settings_damaged"   # saved with the settings until an admin clears it
+
+_save_lock = threading.Lock()
+_save_timer = None
 
-SETTINGS_FILE = "settings.json"
-settings = {}
 
 # ======== LOAD SETTINGS ========
+def _read(path):
+    with open(path, "r") as f:
+        values = json.load(f)
+    if not isinstance(values, dict):
+        raise ValueError("not a JSON object")
+    return values
+
+
 def load_settings():
-    global settings
-    if os.path.exists(SETTINGS_FILE):
-        try:
-            with open(SETTINGS_FILE, "r") as f:
-                settings = json.load(f)
-        except Exception as e:
-            print(f"[SETTINGS] Failed to load settings: {e}")
-            settings = {}
-    else:
-        settings = {}
-
-    # Ensure defaults
-    defaults = {
-        "price": 0,
-        "till_number": "",
-        "record_time": 10,
-        "email": "",
-        "password": None,
-        "lock_until": 0,
-        "failed_attempts": 0,
-        "admin_whatsapp": "",
-        "whatsapp_logged_in": False  # <=== Persist WhatsApp login
-    }
-    for key, val in defaults.items():
-        if key not in settings:
-            settings[key] = val
+    """
+    (Re)load settings.json into `settings`, falling back to the backup.
+    If neither can be read the bad file is kept aside as
+    settings.json.corrupt and settings_damaged() turns True, so the admin
+    password is not quietly reset to "none set". The flag is saved with
+    the settings, so it survives restarts until clear_damaged().
+    """
+    values = {}
+    damaged = False
+    if os.path.exists(SETTINGS_FILE) or os.path.exists(BACKUP_FILE):
+        for path in (SETTINGS_FILE, BACKUP_FILE):
+            try:
+                values = _read(path)
+                if path == BACKUP_FILE:
+                    log(f"[SETTINGS] {SETTINGS_FILE} unreadable, using {BACKUP_FILE}")
+                break
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                log(f"[SETTINGS] Failed to load {path}: {e}")
+        else:
+            damaged = True
+            if os.path.exists(SETTINGS_FILE):
+                os.replace(SETTINGS_FILE, SETTINGS_FILE + ".corrupt")
+            log("[SETTINGS] No readable settings file; using defaults "
+                f"(damaged file kept as {SETTINGS_FILE}.corrupt)")
+
+    for key, val in DEFAULTS.items():
+        values.setdefault(key, val)
+    if damaged:
+        values[DAMAGED_KEY] = True
+    settings._replace(values)
+    return settings
+
+
+def settings_damaged():
+    """
+    True since a load found only unreadable settings files (the admin
+    password and everything else fell back to defaults), until an admin
+    calls clear_damaged().
+    """
+    return bool(settings.get(DAMAGED_KEY))
+
+
+def clear_damaged():
+    """An admin chose to carry on with the current settings; saves at once."""
+    settings.pop(DAMAGED_KEY, None)
+    save_settings(now=True)
+
 
 # ======== SAVE SETTINGS ========
-def save_settings():
-    global settings
+def save_settings(now=False):
+    """
+    Write settings.json: SAVE_DELAY from now, together with any other saves
+    asked for meanwhile, or at once with `now`.
+    """
+    global _save_timer
+    with _save_lock:
+        if not now:
+            if _save_timer is None:
+                _save_timer = threading.Timer(SAVE_DELAY, flush_settings)
+                _save_timer.daemon = True
+                _save_timer.start()
+            return
+    flush_settings()
+
+
+def flush_settings():
+    """Write any pending save now."""
+    global _save_timer
+    with _save_lock:
+        if _save_timer is not None:
+            _save_timer.cancel()
+            _save_timer = None
+        _write(dict(settings))
+
+
+def _write(values):
+    """Atomic replace: temp file + fsync, old file -> .bak, rename. Caller holds _save_lock."""
+    tmp = SETTINGS_FILE + ".tmp"
     try:
-        with open(SETTINGS_FILE, "w") as f:
-            json.dump(settings, f, indent=4)
+        with open(tmp, "w") as f:
+            json.dump(values, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        if _readable(SETTINGS_FILE):
+            # Only a good file becomes the backup; a damaged one must not
+            # replace the copy load_settings() fell back to
+            os.replace(SETTINGS_FILE, BACKUP_FILE)
+        os.replace(tmp, SETTINGS_FILE)
+        _fsync_dir(os.path.dirname(SETTINGS_FILE))
     except Exception as e:
-        print(f"[SETTINGS] Failed to save settings: {e}")
+        log(f"[SETTINGS] Failed to save settings: {e}")
+
+
+def _readable(path):
+    try:
+        _read(path)
+        return True
+    except Exception:
+        return False
+
+
+def _fsync_dir(path):
+    """Make the renames durable (POSIX; a no-op where directories can't be opened)."""
+    try:
+        fd = os.open(path or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _flush_at_exit():
+    if _save_timer is not None:
+        flush_settings()
+
+
+atexit.register(_flush_at_exit)
 
 # ======== PASSWORD HANDLING ========
 def hash_password(password: str) -> str:
@@ -50,13 +273,11 @@ def hash_password(password: str) -> str:
 
 def is_locked() -> bool:
     """Check if too many failed attempts or lock time active"""
-    import time
     lock_until = settings.get("lock_until", 0)
     failed = settings.get("failed_attempts", 0)
     return failed >= 5 and time.time() < lock_until
 
 def register_failed_attempt():
-    import time
     settings["failed_attempts"] = settings.get("failed_attempts", 0) + 1
     if settings["failed_attempts"] >= 5:
         settings["lock_until"] = time.time() + 300  # lock for 5 minutes
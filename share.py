@@ -1,46 +1,41 @@
-import os
 import threading
 import time
 import traceback
 
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import pyautogui
-
 from logger import log
+import transcode
+import catalog
 
-VIDEO_DIR = "/home/user/Automated_Photobooth/videos"
 CHROME_PROFILE = "/home/user/.whatsapp_session"
 CHROMEDRIVER_PATH = "/usr/bin/chromedriver"
 
 
 #Helper Functions
-def get_last_video():
-    if not os.path.exists(VIDEO_DIR):
-        return None
-    videos = sorted(
-        [os.path.join(VIDEO_DIR, f) for f in os.listdir(VIDEO_DIR) if f.endswith(".mp4")],
-        key=os.path.getmtime,
-        reverse=True
-    )
-    return videos[0] if videos else None
+# selenium and pyautogui (which needs the display) are imported inside the
+# functions that drive the browser, so importing this module stays cheap.
+def _open_chrome():
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
 
-
-def login_whatsapp():
-    """One-time WhatsApp Web login. Admin scans QR, session saved."""
-    log("Opening WhatsApp Web for login...")
     chrome_options = Options()
     chrome_options.add_argument("--start-maximized")
     chrome_options.add_argument(f"--user-data-dir={CHROME_PROFILE}")
-
-    driver = webdriver.Chrome(
+    return webdriver.Chrome(
         service=Service(CHROMEDRIVER_PATH),
         options=chrome_options
     )
+
+
+def get_last_video():
+    """Newest finished session video, from the catalog."""
+    return catalog.latest_path()
+
+
+def login_whatsapp():
+    """One-time WhatsApp Web login. Admin scans QR, session saved."""
+    log("Opening WhatsApp Web for login...")
+    driver = _open_chrome()
     driver.get("https://web.whatsapp.com")
     log("Scan QR code if required. Session will be reused.")
     return driver
@@ -50,6 +45,11 @@ def focus_chat_box(driver):
     """
     Focus WhatsApp chat box, handling overlays and click interception.
     """
+    import pyautogui
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
     attempts = 5
     input_box = None
     for i in range(attempts):
@@ -95,16 +95,17 @@ def share_via_whatsapp(client_phone):
     log(f"Sending WhatsApp video")
 
     def send_thread():
+        import pyautogui
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+
         driver = None
         try:
-            chrome_options = Options()
-            chrome_options.add_argument("--start-maximized")
-            chrome_options.add_argument(f"--user-data-dir={CHROME_PROFILE}")
+            # Wait for a background transcode of this video to finish
+            video_file = transcode.resolve(video)
 
-            driver = webdriver.Chrome(
-                service=Service(CHROMEDRIVER_PATH),
-                options=chrome_options
-            )
+            driver = _open_chrome()
 
             # Open client chat
             driver.get(f"https://web.whatsapp.com/send?phone={client_phone}")
@@ -117,7 +118,7 @@ def share_via_whatsapp(client_phone):
             file_input = WebDriverWait(driver, 20).until(
                 EC.presence_of_element_located((By.XPATH, "//input[@type='file']"))
             )
-            file_input.send_keys(video)
+            file_input.send_keys(video_file)
             log("Video attached")
 
             #Wait for WhatsApp to prepare video
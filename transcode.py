@@ -0,0 +1,267 @@
+# transcode.py
+# Background transcode queue. Jobs are stored in a JSON file so unfinished
+# work resumes after a restart; a small pool of worker threads runs ffmpeg.
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+
+import catalog
+from config import BASE_DIR
+from logger import log
+from settings import settings
+
+JOBS_FILE = os.path.join(BASE_DIR, "transcode_jobs.json")
+DEFAULT_WORKERS = 1
+KEEP_FINISHED = 200   # finished jobs kept in the file for status lookups
+
+# Job status values
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_jobs = {}                 # job id -> job dict
+_cond = threading.Condition()
+_workers = []
+
+
+#Persistence
+def _load():
+    if not os.path.exists(JOBS_FILE):
+        return {}
+    try:
+        with open(JOBS_FILE, "r") as f:
+            return {job["id"]: job for job in json.load(f)}
+    except Exception as e:
+        log(f"[TRANSCODE] Failed to load job file: {e}")
+        return {}
+
+
+def _save():
+    """Write the job list atomically. Caller holds _cond."""
+    jobs = sorted(_jobs.values(), key=lambda j: j["created"])
+    finished = [j for j in jobs if j["status"] in (DONE, FAILED)]
+    drop = {j["id"] for j in finished[:-KEEP_FINISHED]} if len(finished) > KEEP_FINISHED else set()
+    for job_id in drop:
+        del _jobs[job_id]
+
+    tmp = JOBS_FILE + ".tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump([j for j in jobs if j["id"] not in drop], f, indent=2)
+        os.replace(tmp, JOBS_FILE)
+    except Exception as e:
+        log(f"[TRANSCODE] Failed to save job file: {e}")
+
+
+#ffmpeg
+def audio_input_args(audio):
+    """
+    ffmpeg input options for a song track {"path", "offset", "duration"}.
+    A positive offset seeks into the song, a negative one delays it, and
+    the track is trimmed to the session length.
+    """
+    args = []
+    offset = audio.get("offset") or 0.0
+    if offset > 0:
+        args += ["-ss", f"{offset:.3f}"]
+    elif offset < 0:
+        args += ["-itsoffset", f"{-offset:.3f}"]
+    if audio.get("duration"):
+        args += ["-t", f"{audio['duration']:.3f}"]
+    return args + ["-i", audio["path"]]
+
+
+def whatsapp_cmd(input_file, output_file, audio=None, input_args=None):
+    """
+    ffmpeg command converting an OpenCV mp4 (or an MJPEG frame log, with
+    `input_args`) to WhatsApp-compatible H.264, muxing the session song in
+    the same pass when `audio` is given.
+    """
+    cmd = ["ffmpeg", "-y"] + list(input_args or []) + ["-i", input_file]
+    if audio:
+        cmd += audio_input_args(audio) + ["-map", "0:v:0", "-map", "1:a:0"]
+    cmd += [
+        "-c:v", "libx264", "-preset", "fast", "-crf", "23",
+        # Webcam MJPEG decodes as yuvj422p; phones only play 4:2:0
+        "-pix_fmt", "yuv420p",
+        "-vf", "scale=trunc(iw/2)*2:trunc(ih/2)*2",
+        "-c:a", "aac", "-b:a", "128k",
+    ]
+    if audio and audio.get("duration"):
+        cmd += ["-t", f"{audio['duration']:.3f}"]
+    return cmd + ["-f", "mp4", output_file]
+
+
+def _run(job):
+    tmp = job["output"] + ".part"
+    cmd = whatsapp_cmd(job["input"], tmp, job.get("audio"), job.get("input_args"))
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        err = result.stderr.decode(errors="replace").strip().splitlines()
+        raise RuntimeError(err[-1] if err else f"ffmpeg exited with {result.returncode}")
+    # Readers never see a half-written output file
+    os.replace(tmp, job["output"])
+    leftovers = [job["audio"]["path"]] if job.get("audio") else []
+    if job.get("remove_input"):
+        leftovers.append(job["input"])
+    for path in leftovers:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+#Workers
+def _worker():
+    while True:
+        with _cond:
+            job = None
+            while job is None:
+                queued = [j for j in _jobs.values() if j["status"] == QUEUED]
+                if queued:
+                    job = min(queued, key=lambda j: j["created"])
+                else:
+                    _cond.wait()
+            job["status"] = RUNNING
+            job["started"] = time.time()
+            _save()
+
+        log(f"[TRANSCODE] Encoding {os.path.basename(job['input'])}")
+        try:
+            _run(job)
+            status, error = DONE, None
+        except Exception as e:
+            status, error = FAILED, str(e)
+            log(f"[TRANSCODE] Job {job['id']} failed: {e}")
+
+        try:
+            if status == DONE:
+                catalog.set_output(job["input"], job["output"], replaced=job.get("remove_input", False))
+            else:
+                catalog.update(job["input"], status=catalog.FAILED)
+        except Exception as e:
+            log(f"[TRANSCODE] Catalog update failed: {e}")
+
+        with _cond:
+            job["status"] = status
+            job["error"] = error
+            job["finished"] = time.time()
+            _save()
+            _cond.notify_all()
+
+        if status == DONE:
+            log(f"[TRANSCODE] Ready → {job['output']} "
+                f"({job['finished'] - job['started']:.1f}s)")
+
+
+def start_workers(count=None):
+    """Load the job file, requeue unfinished jobs and start the worker pool."""
+    with _cond:
+        if _workers:
+            return
+        _jobs.update(_load())
+        resumed = 0
+        for job in _jobs.values():
+            if job["status"] in (QUEUED, RUNNING):
+                job["status"] = QUEUED
+                resumed += 1
+        if resumed:
+            log(f"[TRANSCODE] Resuming {resumed} unfinished job(s)")
+            _save()
+
+        count = int(count or settings.get("transcode_workers", DEFAULT_WORKERS))
+        for i in range(max(1, count)):
+            t = threading.Thread(target=_worker, name=f"transcode-{i}", daemon=True)
+            t.start()
+            _workers.append(t)
+        _cond.notify_all()
+
+
+#Public API
+def submit(input_file, output_file=None, audio=None, input_args=None, remove_input=False):
+    """
+    Queue a WhatsApp transcode of `input_file` and return the job id.
+    `audio` ({"path", "offset", "duration"}) is muxed in the same pass; the
+    song is copied next to the video first, since the next customer may
+    pick a new one before the job runs. `input_args` are ffmpeg options
+    for the input (e.g. for an MJPEG frame log) and `remove_input` deletes
+    the input once the output is ready.
+    """
+    start_workers()
+    input_file = os.path.abspath(input_file)
+    output_file = os.path.abspath(output_file or input_file.replace(".mp4", "_wa.mp4"))
+    if audio and os.path.exists(audio["path"]):
+        song_copy = os.path.splitext(input_file)[0] + "_song" + os.path.splitext(audio["path"])[1]
+        shutil.copyfile(audio["path"], song_copy)
+        audio = dict(audio, path=song_copy)
+    else:
+        audio = None
+    job = {
+        "id": uuid.uuid4().hex[:12],
+        "input": input_file,
+        "output": output_file,
+        "audio": audio,
+        "input_args": list(input_args or []),
+        "remove_input": remove_input,
+        "status": QUEUED,
+        "created": time.time(),
+        "started": None,
+        "finished": None,
+        "error": None,
+    }
+    with _cond:
+        _jobs[job["id"]] = job
+        _save()
+        _cond.notify_all()
+    log(f"[TRANSCODE] Queued {os.path.basename(input_file)} (job {job['id']})")
+    return job["id"]
+
+
+def status(job_id):
+    """Return a copy of the job dict, or None if unknown."""
+    with _cond:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+
+def wait(job_id, timeout=None):
+    """Block until the job is done or failed (or timeout). Returns the job dict."""
+    deadline = None if timeout is None else time.time() + timeout
+    with _cond:
+        while True:
+            job = _jobs.get(job_id)
+            if job is None or job["status"] in (DONE, FAILED):
+                return dict(job) if job else None
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                return dict(job)
+            _cond.wait(remaining)
+
+
+def find_job(path):
+    """The most recent job whose input or output is `path`, or None."""
+    path = os.path.abspath(path)
+    with _cond:
+        matches = [j for j in _jobs.values() if path in (j["input"], j["output"])]
+        return dict(max(matches, key=lambda j: j["created"])) if matches else None
+
+
+def resolve(path, timeout=None):
+    """
+    Return the finished, shareable file for a recording. If `path` has a
+    pending transcode, wait for it; falls back to `path` on failure.
+    """
+    job = find_job(path)
+    if job is None:
+        return path
+    if job["status"] not in (DONE, FAILED):
+        log("[TRANSCODE] Waiting for video to finish encoding...")
+        job = wait(job["id"], timeout)
+    if job and job["status"] == DONE and os.path.exists(job["output"]):
+        return job["output"]
+    return path
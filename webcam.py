@@ -4,13 +4,22 @@ import time
 import numpy as np
 from datetime import datetime
 from logger import log
-
-CASCADE_FILE = "haarcascade_frontalface_default.xml"
-VIDEO_DIR = "/home/user/Automated_Photobooth/videos"
-
-face_cascade = cv2.CascadeClassifier(CASCADE_FILE)
-if face_cascade.empty():
-    raise Exception("Haar cascade not found")
+from settings import settings
+from config import VIDEO_DIR
+import catalog
+from analysis import FrameAnalysis
+from framepool import FramePool
+from exposure import ExposureController
+from detection import make_scheduler, log_stats
+from face_detectors import detector_from_settings
+from camera import get_camera
+from writer import open_writer, ProxyRecorder, log_stats as log_writer_stats
+
+
+# Runs the face detector every N frames and tracks the face in between;
+# built per preview/recording from the current settings
+_detector = None
+_exposure = ExposureController()
 
 _camera = None
 _preview_running = False
@@ -21,6 +30,8 @@ _last_center = None
 SMOOTHING = 0.85
 DEAD_ZONE = 20
 
+SHARPEN_KERNEL = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
+
 # Ensure video directory exists
 os.makedirs(VIDEO_DIR, exist_ok=True)
 
@@ -32,28 +43,29 @@ def safe_set(cam, prop, value):
 
 #Camera Preview
 def open_camera_preview():
-    global _camera, _preview_running
+    global _camera, _preview_running, _detector, _exposure
 
     if _preview_running:
         return
 
-    _camera = cv2.VideoCapture(0)
-    if not _camera.isOpened():
-        log("❌ Webcam not available")
+    # Shared camera: the preview can stay open while a session records
+    _camera = get_camera().subscribe()
+    if _camera is None:
         return
 
     safe_set(_camera, cv2.CAP_PROP_AUTOFOCUS, 0)
+    _detector = make_scheduler(detector_from_settings(settings), settings)
+    _exposure = _make_exposure()
     _preview_running = True
     log("Camera preview opened")
 
+    pool = FramePool()
     while _preview_running:
         ret, frame = _camera.read()
         if not ret:
             break
 
-        frame = _center_object(frame)
-        frame = _auto_brightness(frame, _camera)
-        frame = _auto_focus(frame)
+        frame = _process_frame(frame, _camera, pool)
         cv2.imshow("Camera Preview", frame)
 
         if cv2.waitKey(1) & 0xFF == ord("q"):
@@ -72,11 +84,10 @@ def close_camera_preview():
 
 #Video Recording
 def record_video(duration, phone_number=None):
-    global LAST_RECORDED_VIDEO
+    global LAST_RECORDED_VIDEO, _detector, _exposure
 
-    cam = cv2.VideoCapture(0)
-    if not cam.isOpened():
-        log("Webcam not available")
+    cam = get_camera().subscribe()
+    if cam is None:
         return None
 
     ret, frame = cam.read()
@@ -85,56 +96,79 @@ def record_video(duration, phone_number=None):
         cam.release()
         return None
 
+    _detector = make_scheduler(detector_from_settings(settings), settings)
+    _exposure = _make_exposure()
     frame = _center_object(frame)
     h, w, _ = frame.shape
-    fps = 30
 
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     path = os.path.join(VIDEO_DIR, f"Finetake_Photography_{ts}.mp4")
 
-    out = cv2.VideoWriter(
-        path,
-        cv2.VideoWriter_fourcc(*"mp4v"),
-        fps,
-        (w, h)
-    )
+    out, encoded = open_writer(path, (w, h), settings)
     if not out.isOpened():
         log("❌ VideoWriter failed to open")
         cam.release()
         return None
+    catalog.add(path, phone_number, codec="h264" if encoded else "mp4v")
+    proxy = None
+    if settings.get("record_proxy", True):
+        proxy = ProxyRecorder(path, out.fps, settings.get("proxy_height", 360), poster_at=duration / 2)
 
     log("Recording started")
     start = time.time()
 
+    # Depth 2: the writer keeps the previous frame for gap filling
+    pool = FramePool(depth=2)
     while time.time() - start < duration:
-        ret, frame = cam.read()
+        ret, frame, frame_ts = cam.read_timed()
         if not ret:
             break
 
-        frame = _center_object(frame)
-        frame = _auto_brightness(frame, cam)
-        frame = _auto_focus(frame)
-        frame = cv2.resize(frame, (w, h))
-        out.write(frame)
+        frame = _process_frame(frame, cam, pool)
+        if frame.shape[:2] != (h, w):
+            frame = cv2.resize(frame, (w, h), dst=pool.get("resize", (h, w, 3)))
+        out.write(frame_ts, frame)
+        if proxy:
+            proxy.write(frame_ts, frame)
         cv2.imshow("Recording", frame)
 
         if cv2.waitKey(1) & 0xFF == ord("q"):
             break
 
     cam.release()
-    out.release()
+    end_ts = time.time()
+    out.close(end_ts)
+    proxy_path, poster_path = proxy.close(end_ts) if proxy else (None, None)
     cv2.destroyAllWindows()
+    log_stats(_detector)
+    log_writer_stats(out)
 
-    if not os.path.exists(path) or os.path.getsize(path) < 10000:
+    if out.failed or not os.path.exists(path) or os.path.getsize(path) < 10000:
         log("Video file not saved correctly")
+        catalog.finish(path, status=catalog.BROKEN)
         return None
 
+    catalog.finish(path, round(out.written / out.fps, 2), proxy_path=proxy_path, poster_path=poster_path)
     LAST_RECORDED_VIDEO = path
     log(f"Session completed → {path}")
     return path
 
+def _process_frame(frame, cam, pool=None):
+    """
+    Centering, brightness and focus, all reading one shared analysis.
+    With a FramePool every stage writes into a reused buffer.
+    """
+    analysis = FrameAnalysis(frame, pool)
+    frame = _center_object(frame, analysis, pool)
+    frame = _auto_brightness(frame, cam, analysis, pool)
+    frame = _auto_focus(frame, analysis, pool)
+    return frame
+
+def _dst(pool, name, frame):
+    return pool.like(name, frame) if pool else None
+
 # Object Centering
-def _center_object(frame):
+def _center_object(frame, analysis=None, pool=None):
     """
     Smooth digital pan to keep object centered (NO zooming).
     Only moves the frame slightly if the object is far from center.
@@ -143,11 +177,11 @@ def _center_object(frame):
     h, w, _ = frame.shape
     frame_cx, frame_cy = w // 2, h // 2
 
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+    analysis = analysis or FrameAnalysis(frame)
+    face = _detector.update(analysis.gray)
 
-    if len(faces):
-        x, y, fw, fh = max(faces, key=lambda f: f[2]*f[3])
+    if face is not None:
+        x, y, fw, fh = face
         cx, cy = x + fw // 2, y + fh // 2
 
         if _last_center is None:
@@ -171,29 +205,34 @@ def _center_object(frame):
 
     # Digital pan only (shift frame slightly)
     M = np.float32([[1, 0, -dx], [0, 1, -dy]])
-    shifted_frame = cv2.warpAffine(frame, M, (w, h), borderMode=cv2.BORDER_REPLICATE)
+    shifted_frame = cv2.warpAffine(
+        frame, M, (w, h),
+        dst=_dst(pool, "center", frame),
+        borderMode=cv2.BORDER_REPLICATE
+    )
 
     return shifted_frame
 
 #Brightness & Focus
-def _auto_brightness(frame, cam):
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    diff = 120 - gray.mean()
-    exposure = cam.get(cv2.CAP_PROP_EXPOSURE)
+def _make_exposure():
+    return ExposureController(rate_hz=settings.get("exposure_rate_hz", 2.0))
 
-    if diff > 15:
-        safe_set(cam, cv2.CAP_PROP_EXPOSURE, exposure - 0.01)
-    elif diff < -15:
-        safe_set(cam, cv2.CAP_PROP_EXPOSURE, exposure + 0.01)
-
-    alpha = 1.0 + diff / 300
-    return cv2.convertScaleAbs(frame, alpha=alpha, beta=0)
+# The analysis is taken before centering; a small pan does not change the
+# global luma statistics in any meaningful way.
+def _auto_brightness(frame, cam, analysis=None, pool=None):
+    """
+    Exposure is adjusted a few times per second with hysteresis; the
+    per-frame gain is a cached LUT lookup.
+    """
+    analysis = analysis or FrameAnalysis(frame)
+    _exposure.observe(analysis.brightness)
+    _exposure.control(cam)
+    return _exposure.apply(frame, dst=_dst(pool, "brightness", frame))
 
-def _auto_focus(frame):
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+def _auto_focus(frame, analysis=None, pool=None):
+    analysis = analysis or FrameAnalysis(frame)
+    sharpness = analysis.sharpness
 
     if sharpness < 80:
-        kernel = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
-        frame = cv2.filter2D(frame, -1, kernel)
+        frame = cv2.filter2D(frame, -1, SHARPEN_KERNEL, dst=_dst(pool, "focus", frame))
     return frame
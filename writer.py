@@ -0,0 +1,350 @@
+# writer.py
+# Video writers used by the recording paths.
+import os
+import shutil
+import subprocess
+
+import cv2
+
+from logger import log
+from framepool import FramePool
+from transcode import audio_input_args
+
+DEFAULT_FPS = 30
+DEFAULT_PROXY_HEIGHT = 360
+POSTER_QUALITY = 85
+
+# Recording backends (settings["video_backend"])
+BACKEND_OPENCV = "opencv"   # mp4v through cv2.VideoWriter, re-encoded after the session
+BACKEND_FFMPEG = "ffmpeg"   # H.264 encoded live through an ffmpeg pipe
+
+
+class FFmpegPipe:
+    """
+    Streams raw BGR frames into a long-lived ffmpeg process that encodes
+    WhatsApp-compatible H.264 (yuv420p, faststart) while recording.
+    Same write/release/isOpened surface as cv2.VideoWriter.
+
+    ffmpeg is launched by start() on the first frame so the song can be
+    muxed in the same pass, aligned to when that frame was captured.
+    """
+
+    def __init__(self, path, fps, size, preset="veryfast", crf=23):
+        self.path = path
+        self.fps = fps
+        self.size = size
+        self.preset = preset
+        self.crf = crf
+        self.proc = None
+        self.failed = shutil.which("ffmpeg") is None
+        if self.failed:
+            log("[WRITER] ffmpeg not available")
+
+    def start(self, audio=None):
+        """Launch ffmpeg. `audio` is a track dict from ConstantRateWriter.audio_track()."""
+        w, h = self.size
+        cmd = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24",
+            "-s", f"{w}x{h}", "-r", f"{self.fps:g}",
+            "-i", "-",
+        ]
+        if audio:
+            cmd += audio_input_args(audio) + ["-map", "0:v:0", "-map", "1:a:0", "-c:a", "aac", "-b:a", "128k"]
+        cmd += [
+            "-c:v", "libx264", "-preset", self.preset, "-crf", str(self.crf),
+            "-pix_fmt", "yuv420p",
+            "-vf", "scale=trunc(iw/2)*2:trunc(ih/2)*2",
+            "-movflags", "+faststart",
+            self.path
+        ]
+        try:
+            self.proc = subprocess.Popen(
+                cmd, stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+        except OSError as e:
+            log(f"[WRITER] ffmpeg failed to start: {e}")
+            self.failed = True
+
+    def isOpened(self):
+        if self.failed:
+            return False
+        return self.proc is None or self.proc.poll() is None
+
+    def write(self, frame):
+        if self.proc is None and not self.failed:
+            self.start()
+        if not self.isOpened():
+            if not self.failed:
+                log(f"[WRITER] ffmpeg exited mid-recording (code {self.proc.returncode})")
+                self.failed = True
+            return
+        data = frame.data if frame.flags.c_contiguous else frame.tobytes()
+        try:
+            self.proc.stdin.write(data)
+        except (BrokenPipeError, ValueError) as e:
+            log(f"[WRITER] ffmpeg pipe closed: {e}")
+            self.proc.kill()
+            self.failed = True
+
+    def release(self):
+        if self.proc is None:
+            return
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        if self.proc.wait() != 0:
+            log(f"[WRITER] ffmpeg exited with code {self.proc.returncode}")
+            self.failed = True    # the file is truncated or unreadable
+        self.proc = None
+
+
+class MjpegLog:
+    """
+    Frame log for passthrough recording: the camera's JPEG frames written
+    back-to-back, never decoded. ffmpeg reads it with -f mjpeg.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            self.f = open(path, "wb")
+        except OSError as e:
+            log(f"[WRITER] Cannot open frame log: {e}")
+            self.f = None
+
+    def isOpened(self):
+        return self.f is not None
+
+    def write(self, data):
+        self.f.write(data.data if data.flags.c_contiguous else data.tobytes())
+
+    def release(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+
+def mjpeg_input_args(fps):
+    """ffmpeg input options for reading an MjpegLog written at `fps`."""
+    return ["-f", "mjpeg", "-framerate", f"{fps:g}"]
+
+
+class ConstantRateWriter:
+    """
+    cv2.VideoWriter wrapper that keeps the output in step with wall-clock time.
+
+    Every frame is written with the time it was captured. Frames are
+    duplicated to fill gaps when the camera runs slower than `fps` and
+    dropped when it runs faster, so a 30 s session is always a 30 s clip
+    whatever rate the camera actually delivers.
+
+    `sink` is anything with write(frame)/release()/isOpened(); by default
+    an mp4v cv2.VideoWriter. A sink with a start(audio) method is started
+    on the first frame with the song track aligned to that frame.
+    """
+
+    def __init__(self, path, fps, size, fourcc="mp4v", sink=None):
+        self.path = path
+        self.fps = float(fps)
+        self.size = size
+        self.out = sink or cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), self.fps, size)
+
+        self.audio = None
+        self.first_ts = None
+        self.last_ts = None
+        self._next_slot = 0
+        self._last_frame = None
+
+        self.captured = 0
+        self.written = 0
+        self.duplicated = 0
+        self.dropped = 0
+
+    def isOpened(self):
+        return self.out.isOpened()
+
+    @property
+    def failed(self):
+        """True if the sink gave up (e.g. ffmpeg died): frames were lost and the file is unusable."""
+        return bool(getattr(self.out, "failed", False))
+
+    def set_audio(self, path, start_ts, duration=None):
+        """Song playing since `start_ts` (time.time()), to be muxed for `duration` s."""
+        self.audio = {"path": path, "start": start_ts, "duration": duration}
+
+    def audio_track(self):
+        """
+        The song aligned to the first frame: {"path", "offset", "duration"}
+        where a positive offset means the song was already `offset` s in
+        when the first frame was captured. None if there is no song.
+        """
+        if not self.audio or self.first_ts is None:
+            return None
+        duration = self.audio["duration"]
+        if self.written:
+            duration = self.written / self.fps
+        return {
+            "path": self.audio["path"],
+            "offset": round(self.first_ts - self.audio["start"], 3),
+            "duration": round(duration, 3) if duration else None,
+        }
+
+    def write(self, ts, frame):
+        """Write a frame captured at time `ts` (seconds, time.time())."""
+        if self.first_ts is None:
+            self.first_ts = ts
+            if hasattr(self.out, "start"):
+                self.out.start(self.audio_track())
+        self.captured += 1
+        self.last_ts = ts
+
+        slot = int(round((ts - self.first_ts) * self.fps))
+        if slot < self._next_slot:
+            # Camera is ahead of the output rate; this slot is already filled.
+            # Still remember the frame: gaps are filled with the newest image,
+            # and pooled buffers behind older frames may already be reused.
+            self.dropped += 1
+            self._last_frame = frame
+            return
+
+        self._fill_until(slot)
+        self.out.write(frame)
+        self._last_frame = frame
+        self._next_slot += 1
+        self.written += 1
+
+    def _fill_until(self, slot):
+        while self._next_slot < slot and self._last_frame is not None:
+            self.out.write(self._last_frame)
+            self._next_slot += 1
+            self.written += 1
+            self.duplicated += 1
+
+    def close(self, end_ts=None):
+        """Pad to `end_ts` (if given) and release the file."""
+        if end_ts is not None and self.first_ts is not None:
+            self._fill_until(int(round((end_ts - self.first_ts) * self.fps)))
+        self.out.release()
+        self._last_frame = None
+
+    def stats(self):
+        span = (self.last_ts - self.first_ts) if self.captured > 1 else 0.0
+        return {
+            "target_fps": self.fps,
+            "capture_fps": round((self.captured - 1) / span, 2) if span else 0.0,
+            "captured": self.captured,
+            "written": self.written,
+            "duplicated": self.duplicated,
+            "dropped": self.dropped,
+            "duration": round(self.written / self.fps, 2),
+            "failed": self.failed,
+        }
+
+
+def open_writer(path, size, settings):
+    """
+    Open a constant-rate writer on the backend chosen in settings.
+    Returns (writer, encoded) where `encoded` is True when the file is
+    already WhatsApp-ready H.264 and needs no re-encode.
+    """
+    fps = float(settings.get("record_fps", DEFAULT_FPS))
+    if settings.get("video_backend", BACKEND_OPENCV) == BACKEND_FFMPEG:
+        pipe = FFmpegPipe(
+            path, fps, size,
+            preset=settings.get("ffmpeg_preset", "veryfast"),
+            crf=settings.get("ffmpeg_crf", 23)
+        )
+        if pipe.isOpened():
+            return ConstantRateWriter(path, fps, size, sink=pipe), True
+        log("[WRITER] Falling back to the OpenCV writer")
+    return ConstantRateWriter(path, fps, size), False
+
+
+def open_passthrough_writer(path, settings):
+    """Constant-rate writer that logs compressed camera frames to `path`."""
+    fps = float(settings.get("record_fps", DEFAULT_FPS))
+    return ConstantRateWriter(path, fps, None, sink=MjpegLog(path))
+
+
+class ProxyRecorder:
+    """
+    Writes a small proxy clip (<stem>_proxy.mp4, `height` px tall) and a
+    poster JPEG (<stem>_poster.jpg) next to a master recording, from the
+    frames the recording already has in memory: write() is called with
+    each frame the master gets, so nothing is decoded a second time.
+
+    The poster is the first frame at least `poster_at` seconds in (or the
+    last frame, for shorter clips). Compressed passthrough frames only get
+    the poster, from a single decode.
+    """
+
+    def __init__(self, master_path, fps, height=DEFAULT_PROXY_HEIGHT, poster_at=0.0):
+        stem = os.path.splitext(master_path)[0]
+        self.proxy_path = stem + "_proxy.mp4"
+        self.poster_path = stem + "_poster.jpg"
+        self.fps = float(fps)
+        self.height = int(height)
+        self.poster_at = float(poster_at)
+        self.size = None
+        self.out = None
+        self.first_ts = None
+        self.poster = None
+        self._last = None
+        # The proxy's own writer keeps the previous frame for gap filling
+        self._pool = FramePool(depth=3)
+
+    def _small(self, frame):
+        h, w = frame.shape[:2]
+        if self.size is None:
+            pw = max(2, int(w * self.height / h) // 2 * 2)
+            self.size = (pw, self.height)
+        return cv2.resize(frame, self.size, dst=self._pool.get("proxy", (self.size[1], self.size[0], 3)),
+                          interpolation=cv2.INTER_AREA)
+
+    def write(self, ts, frame):
+        if self.first_ts is None:
+            self.first_ts = ts
+        if frame.ndim != 3:
+            # JPEG bytes from a passthrough recording, as (1, N) from the camera
+            self._last = frame
+            if self.poster is None and ts - self.first_ts >= self.poster_at:
+                image = cv2.imdecode(frame.ravel(), cv2.IMREAD_COLOR)
+                if image is not None:
+                    self._save_poster(self._small(image))
+            return
+
+        small = self._small(frame)
+        if self.out is None:
+            self.out = ConstantRateWriter(self.proxy_path, self.fps, self.size)
+        self.out.write(ts, small)
+        if self.poster is None and ts - self.first_ts >= self.poster_at:
+            self._save_poster(small)
+        self._last = small
+
+    def _save_poster(self, image):
+        if cv2.imwrite(self.poster_path, image, [cv2.IMWRITE_JPEG_QUALITY, POSTER_QUALITY]):
+            self.poster = self.poster_path
+
+    def close(self, end_ts=None):
+        """Finish the proxy; returns (proxy_path or None, poster_path or None)."""
+        if self.poster is None and self._last is not None:
+            last = self._last
+            if last.ndim != 3:
+                last = cv2.imdecode(last.ravel(), cv2.IMREAD_COLOR)
+                last = self._small(last) if last is not None else None
+            if last is not None:
+                self._save_poster(last)
+        proxy = None
+        if self.out is not None:
+            self.out.close(end_ts)
+            proxy = self.proxy_path if self.out.written else None
+        return proxy, self.poster
+
+
+def log_stats(writer, prefix="[WRITER]"):
+    s = writer.stats()
+    log(f"{prefix} capture {s['capture_fps']} fps -> {s['target_fps']:g} fps, "
+        f"{s['duration']}s ({s['duplicated']} duplicated, {s['dropped']} dropped)")